@@ -1,4 +1,6 @@
-from fastapi import FastAPI
+import os
+import anyio
+from fastapi import Depends, FastAPI
 from api.achievements import router as achievementsRouter
 from api.users import router as usersRouter
 from api.quests import router as questsRouter
@@ -7,17 +9,17 @@ from api.friends import router as friendsRouter
 from api.posts import router as postsRouter
 from api.feed import router as feedRouter
 from api.admin import router as adminRouter
-from api.milestones import (
-    QUEST_MILESTONES,
-    FRIEND_MILESTONES,
-    LIKE_MILESTONES,
-    VERIFICATION_MILESTONES,
-)
-
-from db import models, get_db
-
+from api.metrics import router as metricsRouter
+from api.images import image_pool
+from api.utils import password_pool
+import api.pubsub as pubsub
+from api.auth import verify_admin
+import api.sessions as sessions
 from fastapi.middleware.cors import CORSMiddleware
 
+# Threads available to sync endpoints and blocking calls from async ones
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", 40))
+
 app = FastAPI()
 
 
@@ -37,16 +39,22 @@ app.include_router(friendsRouter)
 app.include_router(postsRouter)
 app.include_router(feedRouter)
 app.include_router(adminRouter)
+# Metrics describe the deployment, only admins read them
+app.include_router(metricsRouter, dependencies=[Depends(verify_admin)])
 
 
 @app.on_event("startup")
 async def startup_event():
-    db = next(get_db())
-    try:
-        models.Achievements.load_achievements(QUEST_MILESTONES, db)
-        models.Achievements.load_achievements(FRIEND_MILESTONES, db)
-        models.Achievements.load_achievements(LIKE_MILESTONES, db)
-        models.Achievements.load_achievements(VERIFICATION_MILESTONES, db)
-    except Exception:
-        print("Error loading achievements!")
-        print("Assuming they are already defined.")
+    # Migrations and seed data are applied by `python -m db.manage migrate seed`
+    # before the workers start, so startup does no database work
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    pubsub.start()
+    sessions.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    image_pool.shutdown()
+    password_pool.shutdown()
+    pubsub.stop()
+    sessions.stop()
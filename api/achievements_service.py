@@ -80,7 +80,7 @@ class AchievementService:
     ) -> List[dict]:
         """Check achievements related to making friends."""
         new_achievements = []
-        friend_count = len(models.Friends.get_friends(user_id, db))
+        friend_count = models.Friends.count_friends(user_id, db)
 
         for milestone, achievement in milestones.FRIEND_MILESTONES.items():
             if (
@@ -1,55 +1,97 @@
 import jwt
-from datetime import datetime, timedelta
-from fastapi import HTTPException, Security, Depends
+import time
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from db import models, get_db, Session
+from api.cache import TTLCache
+import api.authz as authz
 import os
 
 # Secret key to sign the token
 SECRET_KEY = "your-secret-key"
-FORMAT = "%Y-%m-%d %H:%M:%S"
+TOKEN_LIFETIME = timedelta(days=1)
+
+# Format of the "expires" claim of tokens issued before the standard "exp"
+LEGACY_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Decoded tokens are kept so repeated requests skip signature checks
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", 300))
+
+token_cache = TTLCache("token_cache", TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
 
 
 # Function to generate a JWT
 def generate_jwt(user_id, secret_key=SECRET_KEY):
     payload = {
         "user_id": user_id,
-        "expires": (datetime.utcnow() + timedelta(days=1)).strftime(FORMAT),
+        "exp": datetime.now(timezone.utc) + TOKEN_LIFETIME,
     }
 
     token = jwt.encode(payload, secret_key, algorithm="HS256")
     return token
 
 
+def _expiry(payload: dict) -> float:
+    # jwt.decode has already rejected an expired numeric exp
+    if "exp" in payload:
+        return payload["exp"]
+
+    expires = datetime.strptime(payload["expires"], LEGACY_FORMAT)
+    return expires.replace(tzinfo=timezone.utc).timestamp()
+
+
 # HTTP Bearer token scheme
 security = HTTPBearer()
 
 
-# Function to decode a JWT
-def decode_jwt(credentials: HTTPAuthorizationCredentials = Security(security)) -> int:
-    try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=["HS256"])
-        if datetime.strptime(payload["expires"], FORMAT) < datetime.utcnow():
+def decode_token(token: str) -> int:
+    cached = token_cache.get(token)
+    if cached is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+            cached = (payload["user_id"], _expiry(payload))
+        except jwt.ExpiredSignatureError:
             raise HTTPException(status_code=401, detail="Token has expired!")
-        return payload["user_id"]
-    except jwt.ExpiredSignatureError:
+        except (jwt.InvalidTokenError, KeyError, ValueError):
+            raise HTTPException(status_code=401, detail="Invalid token!")
+
+        # only valid tokens are cached, and never beyond their expiry
+        token_cache.set(
+            token, cached, ttl=min(TOKEN_CACHE_TTL, cached[1] - time.time())
+        )
+
+    user_id, expires = cached
+    if expires < time.time():
         raise HTTPException(status_code=401, detail="Token has expired!")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token!")
+
+    return user_id
+
+
+# Function to decode a JWT, banned users are rejected even with a valid token.
+# Async so a cached token and status are checked without a threadpool hop.
+async def decode_jwt(
+    credentials: HTTPAuthorizationCredentials = Security(security),
+) -> int:
+    user_id = decode_token(credentials.credentials)
+
+    if (await authz.get_authorization_async(user_id)).is_banned:
+        raise HTTPException(status_code=403, detail="User is banned")
+
+    return user_id
 
 
 # Same as decode_jwt but for admin users only
-def verify_admin(
+async def verify_admin(
     credentials: HTTPAuthorizationCredentials = Security(security),
-    db: Session = Depends(get_db),
 ) -> int:
-    user_id = decode_jwt(credentials)
+    user_id = await decode_jwt(credentials)
 
     if os.getenv("TEST") == "1":
         return user_id
 
     # Check if the user is an admin
-    if models.Admin.verify_admin(user_id, db):
+    if (await authz.get_authorization_async(user_id)).is_admin:
         return user_id
     else:
         raise HTTPException(
@@ -0,0 +1,65 @@
+import os
+from typing import NamedTuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from db import models, AsyncSessionLocal
+from api.cache import TTLCache
+import api.pubsub as pubsub
+
+# Ban and admin status per user, kept for a short while so authenticated
+# requests do not query them every time. Changes invalidate the entry.
+AUTHZ_CACHE_SIZE = int(os.getenv("AUTHZ_CACHE_SIZE", 10000))
+AUTHZ_CACHE_TTL = float(os.getenv("AUTHZ_CACHE_TTL", 60))
+
+# Invalidations reach the other workers when pubsub is enabled
+INVALIDATE_CHANNEL = "authz_invalidate"
+
+authz_cache = TTLCache("authz_cache", AUTHZ_CACHE_SIZE, AUTHZ_CACHE_TTL)
+
+
+class Authorization(NamedTuple):
+    is_banned: bool
+    is_admin: bool
+
+
+def get_authorization(user_id: int, db: Session) -> Authorization:
+    authorization = authz_cache.get(user_id)
+    if authorization is None:
+        authorization = Authorization(*models.User.get_authorization(user_id, db))
+        authz_cache.set(user_id, authorization)
+
+    return authorization
+
+
+async def get_authorization_async(user_id: int) -> Authorization:
+    # a session is only opened when the cache misses
+    authorization = authz_cache.get(user_id)
+    if authorization is None:
+        async with AsyncSessionLocal() as db:
+            row = await db.run_sync(
+                lambda session: models.User.get_authorization(user_id, session)
+            )
+        authorization = Authorization(*row)
+        authz_cache.set(user_id, authorization)
+
+    return authorization
+
+
+def invalidate(user_id: int, db: Session):
+    """
+    Drops the cached status of a user in this worker and, when pubsub is
+    enabled, in every other worker once db commits.
+    """
+    # dropped again after the commit, a concurrent request may have cached
+    # the old status in between
+    authz_cache.delete(user_id)
+    event.listen(db, "after_commit", lambda _: authz_cache.delete(user_id), once=True)
+    pubsub.publish(INVALIDATE_CHANNEL, str(user_id), db)
+
+
+def _on_invalidate(payload: str):
+    authz_cache.delete(int(payload))
+
+
+# invalidations missed while disconnected are unknown, start afresh
+pubsub.subscribe(INVALIDATE_CHANNEL, _on_invalidate, on_reconnect=authz_cache.clear)
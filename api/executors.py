@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import time
+from fastapi import HTTPException
+import api.metrics as metrics
+
+
+def _timed_call(fn, *args):
+    # runs inside the pool worker, so the timestamps measure queueing and work
+    started = time.monotonic()
+    result = fn(*args)
+    return started, time.monotonic(), result
+
+
+class BoundedExecutor:
+    """
+    Runs blocking work on a thread or process pool from async endpoints.
+    At most max_workers jobs run and max_queue jobs wait, anything beyond
+    that is rejected straight away instead of piling up in the pool's queue.
+    Extra keyword arguments are passed on to executor_class.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        executor_class,
+        max_workers: int,
+        max_queue: int,
+        status_code: int = 503,
+        **executor_kwargs,
+    ):
+        self.name = name
+        self.executor_class = executor_class
+        self.executor_kwargs = executor_kwargs
+        self.max_workers = max_workers
+        self.max_pending = max_workers + max_queue
+        self.status_code = status_code
+
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # created on first use so importing the module does not start workers
+        if self._executor is None:
+            self._executor = self.executor_class(
+                max_workers=self.max_workers, **self.executor_kwargs
+            )
+        return self._executor
+
+    def _acquire(self):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                metrics.increment(f"{self.name}.rejected")
+                raise HTTPException(
+                    status_code=self.status_code,
+                    detail="Server is busy, please try again later",
+                    headers={"Retry-After": "1"},
+                )
+            self._pending += 1
+            self._report()
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+            self._report()
+
+    def _report(self):
+        metrics.set_gauge(f"{self.name}.in_flight", self._pending)
+        metrics.set_gauge(
+            f"{self.name}.queue_depth", max(0, self._pending - self.max_workers)
+        )
+
+    async def run(self, fn, *args):
+        self._acquire()
+        try:
+            with self._lock:
+                executor = self._get_executor()
+            submitted = time.monotonic()
+            future = executor.submit(_timed_call, fn, *args)
+        except BaseException:
+            self._release()
+            raise
+
+        # the slot is freed when the job finishes, even if the caller went away
+        future.add_done_callback(lambda _: self._release())
+
+        started, finished, result = await asyncio.wrap_future(future)
+        metrics.observe(f"{self.name}.queue_time", started - submitted)
+        metrics.observe(f"{self.name}.processing_time", finished - started)
+        return result
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
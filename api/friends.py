@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import session
-from db import get_db, schemas, models
+from sqlalchemy.ext.asyncio import AsyncSession
+from db import get_db, get_async_db, schemas, models
 import api.auth as auth
 from api.achievements_service import AchievementService
 from fastapi import Depends, HTTPException, APIRouter, status
@@ -51,19 +52,21 @@ def remove_friend(
 
 # list all friends
 @router.get("/friends", response_model=list[schemas.FriendResponse])
-def list_friends(
-    db: session = Depends(get_db), user_id: int = Depends(auth.decode_jwt)
+async def list_friends(
+    db: AsyncSession = Depends(get_async_db), user_id: int = Depends(auth.decode_jwt)
 ):
     # list all friends
-    return models.Friends.get_friends(user_id=user_id, db=db)
+    return await models.Friends.get_friends(user_id=user_id, db=db)
 
 
 # check if a user is a friend
 @router.get("/friends/{friend_id}", response_model=bool)
-def check_friend(
+async def check_friend(
     friend_id: int,
-    db: session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user_id: int = Depends(auth.decode_jwt),
 ):
     # check if a user is a friend
-    return models.Friends.are_friends(user_id=user_id, friend_id=friend_id, db=db)
\ No newline at end of file
+    return await models.Friends.check_friendship(
+        user_id=user_id, friend_id=friend_id, db=db
+    )
\ No newline at end of file
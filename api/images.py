@@ -0,0 +1,197 @@
+import base64
+import binascii
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from fastapi import HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image
+from db.blob_store import get_blob_store
+from api.executors import BoundedExecutor
+
+# Longest edge in pixels of the variants generated for each upload
+POST_IMAGE_SIZES = (480, 1080)
+PROFILE_PICTURE_SIZES = (128,)
+
+# Variants are encoded as JPEG by default, WEBP is smaller on modern clients
+VARIANT_FORMAT = os.getenv("IMAGE_VARIANT_FORMAT", "JPEG").upper()
+VARIANT_MEDIA_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+VARIANT_QUALITY = 80
+
+# Image decoding and encoding runs in worker processes off the event loop
+IMAGE_POOL_WORKERS = int(os.getenv("IMAGE_POOL_WORKERS", os.cpu_count() or 1))
+IMAGE_POOL_QUEUE = int(os.getenv("IMAGE_POOL_QUEUE", 16))
+
+# Workers come from a fork server, forking the app itself would copy locks
+# held by its background threads (pub/sub listener, session writer)
+image_pool = BoundedExecutor(
+    "image_pool",
+    ProcessPoolExecutor,
+    IMAGE_POOL_WORKERS,
+    IMAGE_POOL_QUEUE,
+    mp_context=multiprocessing.get_context("forkserver"),
+)
+
+# Post images never change once uploaded
+POST_IMAGE_CACHE_CONTROL = "public, max-age=86400"
+
+# Profile pictures are replaced under the same URL, so clients revalidate
+PROFILE_PICTURE_CACHE_CONTROL = "public, no-cache"
+
+# Quest images change when the quest is updated, same as profile pictures
+QUEST_IMAGE_CACHE_CONTROL = "public, no-cache"
+
+
+def _encode(image: Image.Image, format: str, quality: int) -> bytes:
+    buffer = BytesIO()
+    image.save(buffer, format=format, quality=quality)
+    return buffer.getvalue()
+
+
+def encode_variant(image: Image.Image, size: int) -> bytes:
+    # shrink to fit a size x size box keeping the aspect ratio, never upscale
+    variant = image.copy()
+    variant.thumbnail((size, size))
+    return _encode(variant, VARIANT_FORMAT, VARIANT_QUALITY)
+
+
+def process_image(contents: bytes, sizes) -> Tuple[bytes, Dict[int, bytes]]:
+    """
+    Normalises an uploaded JPEG or PNG to a quality 85 JPEG and renders its
+    size variants. Raises ValueError if the contents are not a valid image.
+    """
+    try:
+        image = Image.open(BytesIO(contents))
+        image.load()
+    except Exception:
+        raise ValueError("Invalid image file")
+
+    if image.format not in ["JPEG", "PNG"]:
+        raise ValueError("Invalid file format")
+
+    # Convert RGBA and palette images to RGB
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    original = _encode(image, "JPEG", 85)
+    variants = {size: encode_variant(image, size) for size in sizes}
+
+    return original, variants
+
+
+# Leading bytes of the formats clients upload
+MAGIC_MEDIA_TYPES = {
+    b"\xff\xd8\xff": "image/jpeg",
+    b"\x89PNG": "image/png",
+    b"GIF8": "image/gif",
+}
+
+
+def decode_inline_image(data: bytes) -> Tuple[bytes, str]:
+    """
+    Images stored in a column by the JSON API are usually base64 text.
+    Returns the decoded bytes and their media type.
+    """
+    try:
+        data = base64.b64decode(data, validate=True)
+    except binascii.Error:
+        pass
+
+    for magic, media_type in MAGIC_MEDIA_TYPES.items():
+        if data.startswith(magic):
+            return data, media_type
+    return data, "application/octet-stream"
+
+
+def variant_key(key: str, size: int) -> str:
+    return f"{key}_{size}.{VARIANT_FORMAT.lower()}"
+
+
+def store_image(original: bytes, variants: Dict[int, bytes]) -> str:
+    # variants are stored under keys derived from the original's key
+    store = get_blob_store()
+    key = store.put_content(original)
+    for size, data in variants.items():
+        store.put(variant_key(key, size), data)
+
+    return key
+
+
+def render_variant(original: bytes, size: int) -> bytes:
+    # runs on the image pool like process_image
+    return encode_variant(Image.open(BytesIO(original)), size)
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+
+    # the header may list several tags, weak comparison is allowed for GET
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in tags
+
+
+async def blob_response(
+    request: Request,
+    key: str,
+    cache_control: str,
+    media_type: str = "image/jpeg",
+    generate: Optional[Callable[[], Awaitable[bytes]]] = None,
+) -> Response:
+    """
+    Serves a stored blob as-is. The content-addressed key doubles as a strong
+    ETag, so a matching If-None-Match is answered without reading the blob.
+    A missing blob is created with generate when it is given.
+    """
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    # the store does blocking I/O, keep it off the event loop
+    store = get_blob_store()
+    data = await run_in_threadpool(store.get, key)
+    if data is None and generate is not None:
+        data = await generate()
+        await run_in_threadpool(store.put, key, data)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    return Response(content=data, media_type=media_type, headers=headers)
+
+
+async def image_response(
+    request: Request,
+    key: str,
+    size: Optional[int],
+    sizes,
+    cache_control: str,
+) -> Response:
+    # serve the original upload unless a size variant is requested
+    if size is None:
+        return await blob_response(request, key, cache_control)
+
+    if size not in sizes:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported image size, use one of {list(sizes)}",
+        )
+
+    # images uploaded before variants existed get them on first request
+    async def generate() -> bytes:
+        original = await run_in_threadpool(get_blob_store().get, key)
+        if original is None:
+            raise HTTPException(status_code=404, detail="Image not found")
+        return await image_pool.run(render_variant, original, size)
+
+    return await blob_response(
+        request,
+        variant_key(key, size),
+        cache_control,
+        media_type=VARIANT_MEDIA_TYPES[VARIANT_FORMAT],
+        generate=generate,
+    )
@@ -0,0 +1,50 @@
+import threading
+from collections import defaultdict
+from fastapi import APIRouter
+
+# In-process metrics, every uvicorn worker reports its own values
+router = APIRouter(tags=["metrics"])
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_gauges = {}
+_timings = {}
+
+
+def increment(name: str, value: int = 1):
+    with _lock:
+        _counters[name] += value
+
+
+def set_gauge(name: str, value: float):
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name: str, seconds: float):
+    with _lock:
+        timing = _timings.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+        timing["count"] += 1
+        timing["total"] += seconds
+        timing["max"] = max(timing["max"], seconds)
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "timings": {
+                name: {
+                    "count": timing["count"],
+                    "avg": timing["total"] / timing["count"],
+                    "max": timing["max"],
+                }
+                for name, timing in _timings.items()
+            },
+        }
+
+
+@router.get("/metrics")
+def read_metrics():
+    return snapshot()
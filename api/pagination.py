@@ -0,0 +1,45 @@
+import base64
+from datetime import datetime
+from typing import Callable, Optional, Tuple
+from fastapi import HTTPException, Response
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Response header carrying the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    raw = f"{created_at.isoformat()}|{id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("utf-8")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    if cursor is None:
+        return None
+
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("utf-8")).decode("utf-8")
+        created_at, id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(
+    rows: list,
+    limit: int,
+    response: Response,
+    key: Callable = lambda row: (row.created_at, row.id),
+) -> list:
+    """
+    Trims a result fetched with limit + 1 rows to the page size and sets the
+    next cursor header when more rows are available. key gives the
+    (created_at, id) pair a row is sorted by.
+    """
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(*key(rows[-1]))
+
+    return rows
@@ -1,7 +1,12 @@
-from fastapi import Depends, HTTPException, APIRouter, File, UploadFile, Form, Response
+from typing import Optional
+from fastapi import Depends, HTTPException, APIRouter, File, UploadFile, Form, Response, Request, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from db import schemas, get_db, models
+from sqlalchemy.ext.asyncio import AsyncSession
+from db import schemas, get_db, get_async_db, models
 import api.auth as auth
+import api.images as images
+from api.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, paginate
 import base64
 from io import BytesIO
 from PIL import Image
@@ -25,15 +30,22 @@ async def create_post(
 ):
     try:
         # Check if the user has a post for this quest+id already
-        if models.Posts.check_posted(user_id=current_user, quest_id=quest_id, db=db):
+        if await run_in_threadpool(
+            models.Posts.check_posted, user_id=current_user, quest_id=quest_id, db=db
+        ):
             raise HTTPException(status_code=400, detail="User has already submitted.")
 
-        # Upload the image
-        image_data = await models.Posts.upload_image(image=image)
+        # Upload the image and its size variants
+        image_key = await models.Posts.upload_image(image=image)
 
         # create new userquest and new post
-        new_post = models.Posts.create_post_transcation(
-            user_id=current_user, quest_id=quest_id, caption=caption, image_data=image_data, db=db
+        new_post = await run_in_threadpool(
+            models.Posts.create_post_transcation,
+            user_id=current_user,
+            quest_id=quest_id,
+            caption=caption,
+            image_key=image_key,
+            db=db,
         )
 
         return schemas.PostCreateResponse(
@@ -45,6 +57,9 @@ async def create_post(
             quest_id=quest_id,
         )
 
+    except HTTPException:
+        db.rollback()
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=f"Failed to create post: {str(e)}")
@@ -52,12 +67,13 @@ async def create_post(
 
 # read all posts information
 @router.get("/posts", response_model=list[schemas.PostResponse])
-def read_posts(
-    db: Session = Depends(get_db), current_user: int = Depends(auth.decode_jwt)
+async def read_posts(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: int = Depends(auth.decode_jwt),
 ):
 
     # Get all posts
-    posts = models.Posts.get_all(db=db)
+    posts = await models.Posts.get_all(db=db)
 
     # Map query results to response model
     return [
@@ -69,9 +85,10 @@ def read_posts(
             dislikes_count=post.dislikes_count,
             created_at=post.created_at,
             image_url=f"/posts/image/{post.id}",
-            quest_id=models.UserQuests.get_quest_id(post.user_quest_id, db),
+            quest_id=post.quest_id,
             username=post.username,
             profile_picture_url=f"/users/profile_picture/{post.username}",
+            questname=post.questname,
         )
         for post in posts
     ]
@@ -79,27 +96,27 @@ def read_posts(
 
 # read post information by post_id
 @router.get("/posts/{post_id}", response_model=schemas.PostResponse)
-def read_post(
+async def read_post(
     post_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
 
     # Get the post by ID
-    post, likes_count, dislikes_count, username, questname = models.Posts.get_by_id(post_id=post_id, db=db)
+    post = await models.Posts.get_by_id(post_id=post_id, db=db)
 
     # Return the response
     return schemas.PostResponse(
         id=post.id,
         user_id=post.user_id,
         caption=post.caption,
-        likes_count=likes_count,
-        dislikes_count=dislikes_count,
+        likes_count=post.likes_count,
+        dislikes_count=post.dislikes_count,
         created_at=post.created_at,
         image_url=f"/posts/image/{post.id}",
-        quest_id=models.UserQuests.get_quest_id(post.user_quest_id, db),
-        username=username,
-        profile_picture_url=f"/users/profile_picture/{username}",
-        questname=questname,
+        quest_id=post.quest_id,
+        username=post.username,
+        profile_picture_url=f"/users/profile_picture/{post.username}",
+        questname=post.questname,
     )
 
 
@@ -107,36 +124,31 @@ def read_post(
 @router.get("/posts/image/{post_id}", status_code=200)
 async def get_image(
     post_id: int,
+    request: Request,
+    size: Optional[int] = None,
     db: Session = Depends(get_db),
 ):
-    post = db.query(models.Posts).filter(models.Posts.id == post_id).first()
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-
-    if not post.image:
-        raise HTTPException(status_code=404, detail="Image not found")
-
-    try:
-        image = Image.open(BytesIO(post.image))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get image: {e}")
-
-    # encode the image as JPEG
-    buffer = BytesIO()
-    image.save(buffer, format="JPEG")
-    buffer.seek(0)
-
-    return Response(content=buffer.getvalue(), media_type="image/jpeg")
+    # uploads are already normalised to JPEG, serve the stored bytes as-is
+    image_key = await run_in_threadpool(
+        models.Posts.get_image_key, post_id=post_id, db=db
+    )
+    return await images.image_response(
+        request,
+        image_key,
+        size,
+        images.POST_IMAGE_SIZES,
+        images.POST_IMAGE_CACHE_CONTROL,
+    )
 
 
 # read all posts by a user
 @router.get("/users/posts/{user_id}", response_model=list[schemas.PostResponse])
-def read_user_posts(
+async def read_user_posts(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: int = Depends(auth.decode_jwt),
 ):
-    posts = models.Posts.get_by_user(user_id=user_id, db=db)
+    posts = await models.Posts.get_by_user(user_id=user_id, db=db)
 
     return [
         schemas.PostResponse(
@@ -147,9 +159,10 @@ def read_user_posts(
             dislikes_count=post.dislikes_count,
             created_at=post.created_at,
             image_url=f"/posts/image/{post.id}",
-            quest_id=models.UserQuests.get_quest_id(post.user_quest_id, db),
+            quest_id=post.quest_id,
             username=post.username,
             profile_picture_url=f"/users/profile_picture/{post.username}",
+            questname=post.questname,
         )
         for post in posts
     ]
@@ -184,6 +197,25 @@ def delete_post(
         raise HTTPException(status_code=400, detail=f"Failed to delete post: {str(e)}")
 
 
+def toggle_reaction(post_id, user_id, reaction_type, messages, db):
+    # messages are (set, removed) for the reaction
+    reaction_id, reacted, likes_count, dislikes_count = (
+        models.PostReactions.toggle_reaction(
+            post_id=post_id, user_id=user_id, reaction_type=reaction_type, db=db
+        )
+    )
+
+    return schemas.PostReactionResponse(
+        id=reaction_id,
+        user_id=user_id,
+        post_id=post_id,
+        message=messages[0] if reacted else messages[1],
+        reacted=reacted,
+        likes_count=likes_count,
+        dislikes_count=dislikes_count,
+    )
+
+
 # like and unlike a post
 @router.post("/posts/like/{post_id}", response_model=schemas.PostReactionResponse)
 def toggle_like(
@@ -191,32 +223,14 @@ def toggle_like(
     db: Session = Depends(get_db),
     current_user: int = Depends(auth.decode_jwt),
 ):
-    # check if post exists
-    post = db.query(models.Posts).filter(models.Posts.id == post_id).first()
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-
-    # check if the user has liked the post
-    like = models.PostReactions.is_liked(post_id=post_id, user_id=current_user, db=db)
-
-    # unlike the post if the user has liked it
-    if like is not None:
-        response = like.unlike_post(db)
-        return response
-
-    # check if the user disliked the post
-    dislike = models.PostReactions.is_disliked(post_id=post_id, user_id=current_user, db=db)
-
-    # remove dislike if the user has disliked the post
-    if dislike is not None:
-        response = dislike.remove_dislike(db)
-
-    # like the post if the user has not liked it
-    response = models.PostReactions.like_post(post_id=post_id, user_id=current_user, db=db)
-    return response
-
-    new_achievements = AchievementService.check_achievements(current_user, db)
-    return {"new_achievements": new_achievements}
+    # like the post, or unlike it if the user has liked it already
+    return toggle_reaction(
+        post_id,
+        current_user,
+        "LIKE",
+        ("Post liked successfully", "Post unliked successfully"),
+        db,
+    )
 
 
 # dislike and remove dislike
@@ -226,29 +240,32 @@ def toggle_dislike(
     db: Session = Depends(get_db),
     current_user: int = Depends(auth.decode_jwt),
 ):
-    # check if post exists
-    post = db.query(models.Posts).filter(models.Posts.id == post_id).first()
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-
-    # check if the user has disliked the post
-    dislike = models.PostReactions.is_disliked(post_id=post_id, user_id=current_user, db=db)
-
-    # undo the dislike if the user has disliked it
-    if dislike is not None:
-        response = dislike.remove_dislike(db)
-        return response
+    # dislike the post, or remove the dislike if the user has disliked it
+    return toggle_reaction(
+        post_id,
+        current_user,
+        "DISLIKE",
+        ("Post disliked successfully", "Dislike removed successfully"),
+        db,
+    )
 
-    # check if the user liked the post
-    like = models.PostReactions.is_liked(post_id=post_id, user_id=current_user, db=db)
 
-    # remove like if the user has liked the post
-    if like is not None:
-        response = like.unlike_post(db)
+# get the current user's reaction to each post of a page
+@router.get("/posts/reactions/me", response_model=list[schemas.MyReactionResponse])
+async def read_my_reactions(
+    post_ids: list[int] = Query(..., max_length=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: int = Depends(auth.decode_jwt),
+):
+    reactions = await models.PostReactions.get_user_reactions(
+        user_id=current_user, post_ids=post_ids, db=db
+    )
 
-    # dislike the post if the user has not liked or disliked it
-    response = models.PostReactions.dislike_post(post_id=post_id, user_id=current_user, db=db)
-    return response
+    # posts without a reaction, or that do not exist, have no reaction set
+    return [
+        schemas.MyReactionResponse(post_id=post_id, reaction=reactions.get(post_id))
+        for post_id in post_ids
+    ]
 
 
 # check if a user has liked a post
@@ -291,51 +308,51 @@ def check_user_dislike(
     return False
 
 
-# read all users who liked a post
-@router.get("/posts/likedby/{post_id}", response_model=list[schemas.UserResponse])
-def read_post_likedby(
+async def read_reactors(post_id, reaction_type, response, cursor, limit, db):
+    # get a page of the users who reacted, newest reaction first
+    reactors = await models.PostReactions.get_reactors(
+        post_id, reaction_type, db, before=decode_cursor(cursor), limit=limit + 1
+    )
+    page = paginate(
+        reactors, limit, response, key=lambda row: (row.created_at, row.reaction_id)
+    )
+
+    return [
+        schemas.ReactorResponse(
+            id=reactor.id,
+            username=reactor.username,
+            profile_picture_url=f"/users/profile_picture/{reactor.username}",
+        )
+        for reactor in page
+    ]
+
+
+# read the users who liked a post
+@router.get("/posts/likedby/{post_id}", response_model=list[schemas.ReactorResponse])
+async def read_post_likedby(
     post_id: int,
-    db: Session = Depends(get_db),
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db),
     current_user: int = Depends(auth.decode_jwt),
 ):
-    # check if post exists
-    post = db.query(models.Posts).filter(models.Posts.id == post_id).first()
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-
-    # get all users who liked a post
-    try:
-        users = models.PostReactions.get_likedby(post_id=post_id, db=db)
-        if users:
-            return users
-        return []
-
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to get users: {str(e)}")
+    return await read_reactors(post_id, "LIKE", response, cursor, limit, db)
 
 
-# read all users who disliked a post
-@router.get("/posts/dislikedby/{post_id}", response_model=list[schemas.UserResponse])
-def read_post_dislikedby(
+# read the users who disliked a post
+@router.get("/posts/dislikedby/{post_id}", response_model=list[schemas.ReactorResponse])
+async def read_post_dislikedby(
     post_id: int,
-    db: Session = Depends(get_db),
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db),
     current_user: int = Depends(auth.decode_jwt),
 ):
-    # check if post exists
-    post = db.query(models.Posts).filter(models.Posts.id == post_id).first()
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
+    return await read_reactors(post_id, "DISLIKE", response, cursor, limit, db)
 
-    # get all users who disliked a post
-    try:
-        users = models.PostReactions.get_dislikedby(post_id=post_id, db=db)
-        if users:
-            return users
-        return []
 
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to get users: {str(e)}")
-    
 # count the number of likes for a post
 @router.get("/posts/likes/count/{post_id}", response_model=int)
 def count_post_likes(post_id: int, db: Session = Depends(get_db)):
@@ -0,0 +1,125 @@
+import logging
+import os
+import select
+import threading
+from collections import defaultdict
+from typing import Callable
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+import db
+
+# Messages between uvicorn workers go through Postgres LISTEN/NOTIFY, so they
+# reach every worker connected to the same database without another service.
+# Off unless "1", each worker then only sees its own changes. AUTHZ_PUBSUB is
+# the name the switch had when only the authorization cache used it.
+PUBSUB = os.getenv("PUBSUB", os.getenv("AUTHZ_PUBSUB", "0")) == "1"
+POLL_INTERVAL = 1.0
+RECONNECT_DELAY = 5.0
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_handlers = defaultdict(list)
+_reconnect_handlers = []
+_listener = None
+
+
+def subscribe(
+    channel: str,
+    handler: Callable[[str], None],
+    on_reconnect: Callable[[], None] = None,
+):
+    """
+    Calls handler with the payload of every message published on channel.
+    Messages sent while the listener was disconnected are lost, on_reconnect
+    runs each time it (re)connects so the subscriber can catch up.
+    Subscribe before start, a worker also receives its own messages.
+    """
+    with _lock:
+        _handlers[channel].append(handler)
+        if on_reconnect is not None:
+            _reconnect_handlers.append(on_reconnect)
+
+
+def publish(channel: str, payload: str, db_session: Session):
+    if not PUBSUB:
+        return
+
+    # sent when the session commits, and dropped if it rolls back
+    db_session.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": channel, "payload": payload},
+    )
+
+
+class _Listener(threading.Thread):
+    def __init__(self):
+        super().__init__(name="pubsub-listener", daemon=True)
+        self.listening = threading.Event()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("Pub/sub listener lost its connection")
+                self.listening.clear()
+                self.stopped.wait(RECONNECT_DELAY)
+
+    def _listen(self):
+        # a pooled connection kept checked out while listening, never returned
+        connection = db.engine.raw_connection()
+        try:
+            dbapi_connection = connection.driver_connection
+            dbapi_connection.autocommit = True
+            with _lock:
+                channels = list(_handlers)
+                reconnect_handlers = list(_reconnect_handlers)
+            with dbapi_connection.cursor() as cursor:
+                for channel in channels:
+                    cursor.execute(f'LISTEN "{channel}"')
+
+            for on_reconnect in reconnect_handlers:
+                on_reconnect()
+            self.listening.set()
+
+            while not self.stopped.is_set():
+                ready, _, _ = select.select([dbapi_connection], [], [], POLL_INTERVAL)
+                if not ready:
+                    continue
+
+                dbapi_connection.poll()
+                while dbapi_connection.notifies:
+                    notify = dbapi_connection.notifies.pop(0)
+                    with _lock:
+                        handlers = list(_handlers[notify.channel])
+                    for handler in handlers:
+                        handler(notify.payload)
+        finally:
+            connection.invalidate()
+
+
+def start() -> threading.Event:
+    """
+    Starts listening on every subscribed channel in a background thread when
+    pubsub is enabled. Returns an event that is set while it is connected.
+    """
+    global _listener
+    if not PUBSUB:
+        return threading.Event()
+
+    with _lock:
+        if _listener is None:
+            _listener = _Listener()
+            _listener.start()
+        return _listener.listening
+
+
+def stop():
+    global _listener
+    with _lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.stopped.set()
+        listener.join()
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import threading
+import time
+from typing import NamedTuple
+from pydantic import TypeAdapter
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from db import models, schemas
+import api.metrics as metrics
+import api.pubsub as pubsub
+
+# The quest list changes rarely and is requested on every app launch, so each
+# worker keeps it serialised. Writes bump the version, which drops the copy.
+# The TTL bounds staleness for other workers when pubsub is off.
+QUEST_CATALOG_TTL = float(os.getenv("QUEST_CATALOG_TTL", 60))
+CHANGED_CHANNEL = "quest_catalog_changed"
+
+_encoder = TypeAdapter(list[schemas.QuestRead])
+
+
+def to_quest_read(quest, has_image: bool, schema=schemas.QuestRead, **fields):
+    return schema(
+        id=quest.id,
+        name=quest.name,
+        description=quest.description,
+        location_long=quest.location_long,
+        location_lat=quest.location_lat,
+        points=quest.points,
+        start_date=quest.start_date,
+        end_date=quest.end_date,
+        image_url=f"/quests/image/{quest.id}" if has_image else None,
+        **fields,
+    )
+
+
+class Catalog(NamedTuple):
+    version: int
+    expires: float
+    quests: list
+    body: bytes
+    etag: str
+
+
+class QuestCatalog:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.version = 0
+
+        self._catalog = None
+        self._lock = threading.Lock()
+
+    def cached(self):
+        catalog = self._catalog
+        if (
+            catalog is not None
+            and catalog.version == self.version
+            and catalog.expires > time.monotonic()
+        ):
+            metrics.increment("quest_catalog.hits")
+            return catalog
+
+        metrics.increment("quest_catalog.misses")
+        return None
+
+    def load(self, db: Session) -> Catalog:
+        # a write during the load bumps the version, so the result is not kept
+        version = self.version
+        return self._keep(version, models.Quests.get_catalog(db))
+
+    async def load_async(self, db: AsyncSession) -> Catalog:
+        version = self.version
+        return self._keep(version, await db.run_sync(models.Quests.get_catalog))
+
+    def _keep(self, version: int, rows) -> Catalog:
+        quests = [to_quest_read(quest, quest.has_image) for quest in rows]
+
+        # the ETag comes from the content, so every worker agrees on it
+        body = _encoder.dump_json(quests)
+        etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        catalog = Catalog(version, time.monotonic() + self.ttl, quests, body, etag)
+
+        with self._lock:
+            if version == self.version:
+                self._catalog = catalog
+        return catalog
+
+    def get(self, db: Session) -> Catalog:
+        return self.cached() or self.load(db)
+
+    def bump(self):
+        with self._lock:
+            self.version += 1
+            self._catalog = None
+
+
+catalog = QuestCatalog(QUEST_CATALOG_TTL)
+
+
+def changed(db: Session):
+    """
+    Drops the catalog in this worker once db commits and, when pubsub is
+    enabled, in every other worker.
+    """
+    event.listen(db, "after_commit", lambda _: catalog.bump(), once=True)
+    pubsub.publish(CHANGED_CHANNEL, "", db)
+
+
+# changes missed while disconnected are unknown, reload on reconnect
+pubsub.subscribe(CHANGED_CHANNEL, lambda _: catalog.bump(), on_reconnect=catalog.bump)
@@ -1,26 +1,115 @@
-from fastapi import Depends, HTTPException, APIRouter
-from db import schemas, get_db
-from sqlalchemy.orm import Session
+from typing import Literal, Optional
+from fastapi import Depends, HTTPException, APIRouter, Request, Response
+from db import schemas, get_db, get_async_db
+from sqlalchemy import select
+from sqlalchemy.orm import Session, undefer
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timezone
 import db.models as models
 import api.auth as auth
+import api.images as images
+import api.quest_catalog as quest_catalog
 from api.achievements_service import AchievementService
 
 router = APIRouter(tags=["quests"])
 
 
-@router.get("/quests", response_model=list[schemas.QuestRead])
-def read_quests(db: Session = Depends(get_db)):
-    # Get all achievements from the database
-    quests = db.query(models.Quests).all()
-    return quests
+# Old clients read quest images inline, ?include=image still sends them
+Include = Optional[Literal["image"]]
 
 
-@router.get("/quests/{quest_id}", response_model=schemas.QuestRead)
-def read_quest(quest_id: int, db: Session = Depends(get_db)):
-    # Get all achievements from the database
-    achievements = db.query(models.Quests).filter(models.Quests.id == quest_id).first()
-    return achievements
+@router.get(
+    "/quests",
+    response_model=list[schemas.QuestReadWithImage],
+    response_model_exclude_unset=True,
+)
+async def read_quests(
+    request: Request,
+    include: Include = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    if include == "image":
+        quests = await db.scalars(
+            select(models.Quests).options(undefer(models.Quests.image))
+        )
+        return [
+            quest_catalog.to_quest_read(
+                quest,
+                quest.image is not None,
+                schemas.QuestReadWithImage,
+                image=quest.image,
+            )
+            for quest in quests
+        ]
+
+    # Served from the catalog, the database is only read after a change
+    quests = quest_catalog.catalog.cached()
+    if quests is None:
+        quests = await quest_catalog.catalog.load_async(db)
+
+    # Clients revalidate with the ETag and get a 304 while nothing changed
+    headers = {"ETag": quests.etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and images.etag_matches(if_none_match, quests.etag):
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=quests.body, media_type="application/json", headers=headers)
+
+
+@router.get("/quests/image/{quest_id}")
+def read_quest_image(quest_id: int, request: Request, db: Session = Depends(get_db)):
+    # a revalidation is answered from the digest without reading the image
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etag = f'"{models.Quests.get_image_digest(quest_id, db)}"'
+        if images.etag_matches(if_none_match, etag):
+            return Response(
+                status_code=304,
+                headers={
+                    "ETag": etag,
+                    "Cache-Control": images.QUEST_IMAGE_CACHE_CONTROL,
+                },
+            )
+
+    image, digest = models.Quests.get_image(quest_id, db)
+    image, media_type = images.decode_inline_image(image)
+    return Response(
+        content=image,
+        media_type=media_type,
+        headers={
+            "ETag": f'"{digest}"',
+            "Cache-Control": images.QUEST_IMAGE_CACHE_CONTROL,
+        },
+    )
+
+
+@router.get(
+    "/quests/{quest_id}",
+    response_model=schemas.QuestReadWithImage,
+    response_model_exclude_unset=True,
+)
+async def read_quest(
+    quest_id: int,
+    include: Include = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Get the quest from the database, the image only when asked for
+    query = select(models.Quests, models.Quests.image.isnot(None)).where(
+        models.Quests.id == quest_id
+    )
+    if include == "image":
+        query = query.options(undefer(models.Quests.image))
+
+    row = (await db.execute(query)).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Quest not found")
+
+    quest, has_image = row
+    if include == "image":
+        return quest_catalog.to_quest_read(
+            quest, has_image, schemas.QuestReadWithImage, image=quest.image
+        )
+    return quest_catalog.to_quest_read(quest, has_image)
 
 
 @router.post("/quests", response_model=schemas.QuestRead)
@@ -39,10 +128,11 @@ def create_quests(quest: schemas.QuestCreate, db: Session = Depends(get_db)):
 
     # Add and commit the quest to the database
     db.add(new_quest)
+    quest_catalog.changed(db)
     db.commit()
     db.refresh(new_quest)  # Refresh to get the ID after insert
 
-    return new_quest
+    return quest_catalog.to_quest_read(new_quest, quest.image is not None)
 
 
 @router.delete("/quests/{quest_id}", status_code=204)
@@ -54,12 +144,13 @@ def delete_quest(quest_id: int, db: Session = Depends(get_db)):
 
     # Delete the quest
     db.delete(quest)
+    quest_catalog.changed(db)
     db.commit()
 
     return None
 
 
-@router.put("/quests/{quest_id}", response_model=schemas.QuestBase)
+@router.put("/quests/{quest_id}", response_model=schemas.QuestRead)
 def update_quest(
     quest_id: int, quest: schemas.QuestCreate, db: Session = Depends(get_db)
 ):
@@ -80,10 +171,11 @@ def update_quest(
         existing_quest.points = quest.points  # type: ignore
         existing_quest.image = quest.image  # type: ignore
 
+        quest_catalog.changed(db)
         db.commit()
         db.refresh(existing_quest)
 
-        return existing_quest
+        return quest_catalog.to_quest_read(existing_quest, quest.image is not None)
 
 
 @router.get(
@@ -98,7 +190,7 @@ def read_user_quests(user_id: int, db: Session = Depends(get_db)):
     )
 
     # Get all quests
-    quests = db.query(models.Quests).all()
+    quests = quest_catalog.catalog.get(db).quests
 
     # Create a quick lookup {quest_id: UserQuests}
     user_quests_map = {uq.quest_id: uq for uq in user_quests}
@@ -152,7 +244,7 @@ def read_logged_in_user_quests(
     )
 
     # Get all quests
-    quests = db.query(models.Quests).all()
+    quests = quest_catalog.catalog.get(db).quests
 
     # Create a quick lookup {quest_id: UserQuests}
     user_quests_map = {uq.quest_id: uq for uq in user_quests}
@@ -1,17 +1,109 @@
-from fastapi import Depends, HTTPException, APIRouter
-from db import schemas, get_db
-from sqlalchemy.orm import Session
+import logging
+import os
+import queue
+import threading
+import time
 from datetime import datetime, timezone
+from db import SessionLocal
 import db.models as models
+import api.metrics as metrics
+from api.auth import TOKEN_LIFETIME
 
-sessionRouter = APIRouter()
+# Tokens are stateless JWTs and nothing reads the sessions table, so logins
+# are only recorded when "1". Recorded logins are written in batches by a
+# background thread, login itself never waits for the insert. The thread also
+# prunes expired rows, whether logins are recorded or not.
+SESSION_STORE = os.getenv("SESSION_STORE", "0") == "1"
+SESSION_QUEUE_SIZE = int(os.getenv("SESSION_QUEUE_SIZE", 10000))
+SESSION_BATCH_SIZE = int(os.getenv("SESSION_BATCH_SIZE", 500))
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", 1))
+SESSION_PRUNE_INTERVAL = float(os.getenv("SESSION_PRUNE_INTERVAL", 3600))
 
+logger = logging.getLogger(__name__)
 
-def create_session(user_id: int, db: Session):
-    # Create a new session token
-    session_token = f"{user_id}-{datetime.now(timezone.utc).isoformat()}"
-    new_session = models.Sessions(user_id=user_id, session_token=session_token)
-    db.add(new_session)
-    db.commit()
-    db.refresh(new_session)
-    return new_session
+_queue = queue.Queue(SESSION_QUEUE_SIZE)
+_writer = None
+
+
+def record(user_id: int, session_token: str):
+    if not SESSION_STORE:
+        return
+
+    # the row expires together with the token
+    created_at = datetime.now(timezone.utc)
+    session = {
+        "user_id": user_id,
+        "session_token": session_token,
+        "created_at": created_at,
+        "expires_at": created_at + TOKEN_LIFETIME,
+    }
+    try:
+        _queue.put_nowait(session)
+    except queue.Full:
+        # the database is falling behind, losing a record beats slow logins
+        metrics.increment("sessions.dropped")
+
+
+def flush() -> int:
+    """
+    Writes the queued sessions, SESSION_BATCH_SIZE rows per insert.
+    Returns the number of rows written.
+    """
+    written = 0
+    while True:
+        batch = []
+        while len(batch) < SESSION_BATCH_SIZE:
+            try:
+                batch.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+        if not batch:
+            return written
+
+        with SessionLocal() as db:
+            models.Sessions.add_many(batch, db)
+        written += len(batch)
+        metrics.increment("sessions.written", len(batch))
+
+
+def prune() -> int:
+    with SessionLocal() as db:
+        pruned = models.Sessions.prune_expired(db)
+    metrics.increment("sessions.pruned", pruned)
+    return pruned
+
+
+class _Writer(threading.Thread):
+    def __init__(self):
+        super().__init__(name="session-writer", daemon=True)
+        self.stopped = threading.Event()
+
+    def run(self):
+        next_prune = time.monotonic()
+        while not self.stopped.wait(SESSION_FLUSH_INTERVAL):
+            try:
+                flush()
+                if time.monotonic() >= next_prune:
+                    prune()
+                    next_prune = time.monotonic() + SESSION_PRUNE_INTERVAL
+            except Exception:
+                metrics.increment("sessions.errors")
+                logger.exception("Failed to write sessions")
+
+        # write what is left before the worker exits
+        flush()
+
+
+def start():
+    global _writer
+    if _writer is None:
+        _writer = _Writer()
+        _writer.start()
+
+
+def stop():
+    global _writer
+    if _writer is not None:
+        _writer.stopped.set()
+        _writer.join()
+        _writer = None
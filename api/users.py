@@ -1,15 +1,21 @@
 from email.policy import HTTP
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Response
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Response, Request
+from fastapi import BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import session, exc
 from io import BytesIO
 from PIL import Image
 
-from db import get_db
+from db import get_db, SessionLocal
 from db import schemas
 from db import models
 
 import api.utils as utils
 import api.auth as auth
+import api.authz as authz
+import api.images as images
+import api.sessions as sessions
 import os
 
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
@@ -18,10 +24,21 @@ router = APIRouter(tags=["users"])
 
 
 @router.post("/users", response_model=schemas.UserResponse)
-def create_user(user: schemas.UserCreate, db: session = Depends(get_db)):
+async def create_user(user: schemas.UserCreate, db: session = Depends(get_db)):
+    # bcrypt runs on the password pool, the database work off the event loop
+    salt = utils.create_salt()
+    hashed_password = await utils.password_pool.run(
+        utils.hash_password, user.password, salt
+    )
+    return await run_in_threadpool(register_user, user, hashed_password, salt, db)
+
+
+def register_user(
+    user: schemas.UserCreate, hashed_password: str, salt: str, db: session
+):
     new_user = None
     try:
-        new_user = models.User.create_user(user, db)
+        new_user = models.User.create_user(user, hashed_password, salt, db)
         if os.getenv("TEST") == "1":
             new_user.is_email_verified = True
             db.commit()
@@ -47,12 +64,48 @@ def create_user(user: schemas.UserCreate, db: session = Depends(get_db)):
 
 
 @router.post("/users/login", status_code=200)
-def login_user(userRequest: schemas.UserLogin, db: session = Depends(get_db)):
+async def login_user(
+    userRequest: schemas.UserLogin,
+    background_tasks: BackgroundTasks,
+    db: session = Depends(get_db),
+):
+    user = await run_in_threadpool(get_login_user, userRequest.username, db)
+
+    # check if the password is correct, bcrypt runs on the password pool
+    if not await utils.password_pool.run(
+        utils.verify_password, userRequest.password, user.password
+    ):
+        raise HTTPException(status_code=400, detail="Incorrect password")
+
+    # move the hash to the configured cost without delaying the response
+    if utils.needs_rehash(user.password):
+        background_tasks.add_task(
+            rehash_password, user.id, userRequest.password, user.password
+        )
+
+    return create_login_session(user)
+
+
+async def rehash_password(user_id: int, password: str, old_hash: str):
+    salt = utils.create_salt()
+    try:
+        new_hash = await utils.password_pool.run(utils.hash_password, password, salt)
+    except HTTPException:
+        # the pool is busy, the next login tries again
+        return
+
+    # the request's session is closed by the time background tasks run
+    def save():
+        with SessionLocal() as db:
+            models.User.replace_password_hash(user_id, old_hash, new_hash, salt, db)
+
+    await run_in_threadpool(save)
+
+
+def get_login_user(username: str, db: session):
     # get the user by username
     user: models.User = (
-        db.query(models.User)
-        .filter(models.User.username == userRequest.username)
-        .first()
+        db.query(models.User).filter(models.User.username == username).first()
     )
 
     if user is None:
@@ -62,25 +115,17 @@ def login_user(userRequest: schemas.UserLogin, db: session = Depends(get_db)):
     if models.BannedUsers.is_banned(user.id, db):
         raise HTTPException(status_code=403, detail="User is banned")
 
-    # check if the password is correct
-    hashed_password = utils.hash_password(userRequest.password, user.salt)
-    if hashed_password != user.password:
-        raise HTTPException(status_code=400, detail="Incorrect password")
+    return user
+
 
-    # create a new session
+def create_login_session(user):
     session_token = auth.generate_jwt(user.id)
-    new_session = models.Sessions(user_id=user.id, session_token=session_token)
 
-    # add and commit the session to
-    try:
-        db.add(new_session)
-        db.commit()
-        db.refresh(new_session)
+    # kept only when the session store is enabled, and written in the background
+    sessions.record(user.id, session_token)
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to create session {e}")
     return {
-        "jwt_token": new_session.session_token,
+        "jwt_token": session_token,
         "user": {"id": user.id, "username": user.username, "email": user.email},
     }
 
@@ -99,10 +144,7 @@ def get_profile(
         "username": user.username,
         "email": user.email,
         "selected_bee": user.selected_bee,
-        "is_admin": db.query(models.Admin)
-        .filter(models.Admin.user_id == user.id)
-        .first()
-        is not None,
+        "is_admin": authz.get_authorization(user.id, db).is_admin,
     }
 
 
@@ -122,23 +164,28 @@ async def upload_profile_picture(
     if len(contents) > MAX_FILE_SIZE:
         raise HTTPException(status_code=400, detail="File size too large")
 
-    image = Image.open(BytesIO(contents))
+    # Convert to JPEG for consistency and render the avatar size variants
+    try:
+        original, variants = await images.image_pool.run(
+            images.process_image, contents, images.PROFILE_PICTURE_SIZES
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Store the blobs and the key off the event loop
+    await run_in_threadpool(save_profile_picture, user_id, original, variants, db)
 
-    # Convert RGBA to RGB
-    if image.mode == "RGBA":
-        image = image.convert("RGB")
+    return {"message": "Profile picture uploaded successfully"}
 
-    # Convert and encode as JPEG for consistency
-    buffer = BytesIO()
-    image.save(buffer, format="JPEG", quality=85)  # Adjust quality if needed
-    buffer.seek(0)
 
-    # Store the binary data in the database
+def save_profile_picture(user_id: int, original: bytes, variants: dict, db: session):
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    user.profile_picture = buffer.getvalue()
+    # Store the image outside the database, the row keeps its key
+    user.profile_picture_key = images.store_image(original, variants)
+    user.profile_picture = None
 
     try:
         db.commit()
@@ -149,32 +196,25 @@ async def upload_profile_picture(
             status_code=500, detail=f"Failed to upload profile picture: {e}"
         )
 
-    return {"message": "Profile picture uploaded successfully"}
-
 
 @router.get("/users/profile_picture/{username}", status_code=200)
-async def get_profile_picture(username: str, db: session = Depends(get_db)):
-    user: models.User = (
-        db.query(models.User).filter(models.User.username == username).first()
+async def get_profile_picture(
+    username: str,
+    request: Request,
+    size: Optional[int] = None,
+    db: session = Depends(get_db),
+):
+    # uploads are already normalised to JPEG, serve the stored bytes as-is
+    profile_picture_key = await run_in_threadpool(
+        models.User.get_profile_picture_key, username, db
+    )
+    return await images.image_response(
+        request,
+        profile_picture_key,
+        size,
+        images.PROFILE_PICTURE_SIZES,
+        images.PROFILE_PICTURE_CACHE_CONTROL,
     )
-    if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-    if user.profile_picture is None:
-        raise HTTPException(status_code=404, detail="Profile picture not found")
-
-    # Decode the binary data to an image
-    try:
-        image = Image.open(BytesIO(user.profile_picture))
-    except Exception:
-        raise HTTPException(status_code=500, detail="Failed to process image")
-
-    # Encode the image as JPEG
-    buffer = BytesIO()
-    image.save(buffer, format="JPEG")
-    buffer.seek(0)
-
-    # Return the JPEG image
-    return Response(content=buffer.getvalue(), media_type="image/jpeg")
 
 
 @router.get("/users/{user_id}", response_model=schemas.ProfileInfoResponse)
@@ -189,8 +229,16 @@ def get_profile_info(
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
 
+    # get all post ids, only the ids so no post row is loaded
+    post_ids = [
+        post_id
+        for (post_id,) in db.query(models.Posts.id).filter(
+            models.Posts.user_id == user_id
+        )
+    ]
+
     # count the number of posts
-    num_posts = db.query(models.Posts).filter(models.Posts.user_id == user_id).count()
+    num_posts = len(post_ids)
 
     # count the number of likes
     num_likes = (
@@ -213,19 +261,7 @@ def get_profile_info(
     num_quests_completed = user.num_quests_completed
 
     # get number of friends
-    num_friends = (
-        db.query(models.Friends)
-        .filter(
-            (models.Friends.user_id == user_id) | (models.Friends.friend_id == user_id)
-        )
-        .count()
-    )
-
-    # get all post ids
-    post_ids = [
-        post.id
-        for post in db.query(models.Posts).filter(models.Posts.user_id == user_id).all()
-    ]
+    num_friends = models.Friends.count_friends(user_id, db)
 
     return schemas.ProfileInfoResponse(
         username=user.username,
@@ -261,18 +297,28 @@ async def update_user_password(
     db: session = Depends(get_db),
     user_id: int = Depends(auth.decode_jwt),
 ):
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = await run_in_threadpool(models.User.get_user, user_id, db)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
 
-    user.password = utils.hash_password(password, user.salt)
+    # a fresh salt, so the new hash uses the configured cost
+    salt = utils.create_salt()
+    hashed_password = await utils.password_pool.run(
+        utils.hash_password, password, salt
+    )
+    return await run_in_threadpool(save_password, user, hashed_password, salt, db)
+
+
+def save_password(user, hashed_password: str, salt: str, db: session):
+    user.password = hashed_password
+    user.salt = salt
     db.commit()
     db.refresh(user)
     return user
 
 
 @router.put("/users/update/email")
-async def update_user_mail(
+def update_user_mail(
     email: str,
     db: session = Depends(get_db),
     user_id: int = Depends(auth.decode_jwt),
@@ -287,7 +333,7 @@ async def update_user_mail(
 
 
 @router.put("/users/update/username")
-async def update_user_username(
+def update_user_username(
     username: str,
     db: session = Depends(get_db),
     user_id: int = Depends(auth.decode_jwt),
@@ -1,13 +1,29 @@
 import bcrypt
+import os
 import random
+from concurrent.futures import ThreadPoolExecutor
 from db import models, get_db
 from sqlalchemy.orm import Session
+from api.executors import BoundedExecutor
 
 SALT = b"$2b$12$oWEEctwkZY/CUopCVaM92O"
 
+# bcrypt releases the GIL, so hashing runs on its own threads instead of the
+# shared threadpool and a login storm cannot starve the other endpoints
+PASSWORD_POOL_WORKERS = int(os.getenv("PASSWORD_POOL_WORKERS", os.cpu_count() or 1))
+PASSWORD_POOL_QUEUE = int(os.getenv("PASSWORD_POOL_QUEUE", 32))
+
+password_pool = BoundedExecutor(
+    "password_pool", ThreadPoolExecutor, PASSWORD_POOL_WORKERS, PASSWORD_POOL_QUEUE
+)
+
+
+# bcrypt cost factor of new hashes, older hashes are rehashed on login
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", 12))
+
 
 def create_salt() -> str:
-    return bcrypt.gensalt().decode("utf-8")
+    return bcrypt.gensalt(PASSWORD_HASH_ROUNDS).decode("utf-8")
 
 
 # Hash password
@@ -16,9 +32,21 @@ def hash_password(password: str, salt: str) -> str:
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(
-        plain_password.encode("utf-8"), hashed_password.encode("utf-8")
-    )
+    try:
+        return bcrypt.checkpw(
+            plain_password.encode("utf-8"), hashed_password.encode("utf-8")
+        )
+    except ValueError:
+        # a malformed stored hash never matches
+        return False
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    # hashes look like $2b$<cost>$<salt and digest>, anything else is replaced
+    try:
+        return int(hashed_password.split("$")[2]) != PASSWORD_HASH_ROUNDS
+    except (IndexError, ValueError):
+        return True
 
 
 def get_random_string(length: int) -> str:
@@ -0,0 +1,52 @@
+# Compares the per-request cost of authenticating a bearer token with the
+# original decode (jwt.decode plus strptime on every call) against the cached
+# decode_token.
+#
+# Usage: python -m benchmarks.auth_overhead [--requests 100000]
+import argparse
+import timeit
+from datetime import datetime, timedelta
+
+import jwt
+
+import api.auth as auth
+
+
+def legacy_token(user_id):
+    expires = (datetime.utcnow() + timedelta(days=1)).strftime(auth.LEGACY_FORMAT)
+    return jwt.encode(
+        {"user_id": user_id, "expires": expires}, auth.SECRET_KEY, algorithm="HS256"
+    )
+
+
+def legacy_decode(token):
+    # decode_jwt as it was before the token cache
+    payload = jwt.decode(token, auth.SECRET_KEY, algorithms=["HS256"])
+    if datetime.strptime(payload["expires"], auth.LEGACY_FORMAT) < datetime.utcnow():
+        raise ValueError("Token has expired!")
+    return payload["user_id"]
+
+
+def report(name, seconds, requests):
+    print(f"{name:<28} {seconds / requests * 1e6:8.2f} us/request")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark token authentication")
+    parser.add_argument("--requests", type=int, default=100000)
+    args = parser.parse_args()
+
+    old_token = legacy_token(1)
+    token = auth.generate_jwt(1)
+
+    before = timeit.timeit(lambda: legacy_decode(old_token), number=args.requests)
+    uncached = timeit.timeit(
+        lambda: (auth.token_cache.clear(), auth.decode_token(token)),
+        number=args.requests,
+    )
+    after = timeit.timeit(lambda: auth.decode_token(token), number=args.requests)
+
+    report("before (decode + strptime)", before, args.requests)
+    report("after, cache miss", uncached, args.requests)
+    report("after, cache hit", after, args.requests)
+    print(f"speedup on cache hit: {before / after:.1f}x")
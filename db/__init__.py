@@ -1,5 +1,8 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session, declarative_base
+from sqlalchemy.pool import NullPool
 import os
 
 # Database configuration
@@ -8,10 +11,49 @@ if DATABASE_URL is None:
     raise ValueError("DATABASE_URL environment variable not set")
 print("Opening connection to database at", DATABASE_URL)
 
+# Connection pool configuration, applied to the sync and the async engine
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+
+# "null" opens a connection per session, needed when every request may run on
+# a different event loop (e.g. the test client)
+DB_ASYNC_POOL = os.getenv("DB_ASYNC_POOL", "queue")
+
+pool_options = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+}
+
 # Set up the database engine
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **pool_options)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def to_async_url(database_url: str):
+    url = make_url(database_url).set(drivername="postgresql+asyncpg")
+
+    # asyncpg takes the libpq sslmode values through its ssl argument
+    if "sslmode" in url.query:
+        query = dict(url.query)
+        query["ssl"] = query.pop("sslmode")
+        url = url.set(query=query)
+
+    return url
+
+
+# Set up the async database engine used by the hot read endpoints
+if DB_ASYNC_POOL == "null":
+    async_engine = create_async_engine(to_async_url(DATABASE_URL), poolclass=NullPool)
+else:
+    async_engine = create_async_engine(to_async_url(DATABASE_URL), **pool_options)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
 Base = declarative_base()
 
 
@@ -22,3 +64,12 @@ def get_db():
         yield session
     finally:
         session.close()
+
+
+# Dependency to get an async session per request
+async def get_async_db():
+    session: AsyncSession = AsyncSessionLocal()
+    try:
+        yield session
+    finally:
+        await session.close()
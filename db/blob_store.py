@@ -0,0 +1,135 @@
+# This file includes the storage backends for image blobs.
+# Rows only keep the content-addressed key of a blob, the bytes live here.
+import hashlib
+import os
+import uuid
+from abc import ABC, abstractmethod
+from typing import Optional
+
+# Storage backend configuration
+BLOB_STORE = os.getenv("BLOB_STORE", "local")
+BLOB_STORE_PATH = os.getenv("BLOB_STORE_PATH", "blobs")
+S3_BUCKET = os.getenv("S3_BUCKET")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+S3_PREFIX = os.getenv("S3_PREFIX", "")
+
+
+def content_key(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobStore(ABC):
+    @abstractmethod
+    def put(self, key: str, data: bytes) -> None:
+        pass
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        pass
+
+    def put_content(self, data: bytes) -> str:
+        # identical content maps to the same key so it is only stored once
+        key = content_key(data)
+        if not self.exists(key):
+            self.put(key, data)
+        return key
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        # fan out into subdirectories to keep directory listings small
+        return os.path.join(self.root, key[:2], key)
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        # keys are derived from the content, a blob that is there is the same
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # write to a temporary file first so readers never see partial blobs,
+        # named per write as threads may store the same key at once
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "xb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+
+class S3BlobStore(BlobStore):
+    """
+    Stores blobs in an S3 bucket. Any S3-compatible service (MinIO, a local
+    moto server) works by pointing endpoint_url at it. Requires boto3.
+    """
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, prefix=""):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("The S3 blob store requires boto3 to be installed")
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def put(self, key: str, data: bytes) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(key))
+        except self.client.exceptions.NoSuchKey:
+            return None
+        return response["Body"].read()
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except self.client.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                return False
+            raise
+        return True
+
+
+_blob_store: Optional[BlobStore] = None
+
+
+def get_blob_store() -> BlobStore:
+    global _blob_store
+
+    if _blob_store is None:
+        if BLOB_STORE == "s3":
+            if S3_BUCKET is None:
+                raise ValueError("S3_BUCKET environment variable not set")
+            _blob_store = S3BlobStore(S3_BUCKET, S3_ENDPOINT_URL, S3_PREFIX)
+        elif BLOB_STORE == "local":
+            _blob_store = LocalBlobStore(BLOB_STORE_PATH)
+        else:
+            raise ValueError(f"Unknown blob store backend: {BLOB_STORE}")
+
+    return _blob_store
@@ -0,0 +1,66 @@
+# Database maintenance commands, run once per deployment before the app
+# workers start so they never run DDL or seed data themselves.
+#
+# Usage: python -m db.manage migrate seed
+import argparse
+import os
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy.orm import Session
+
+from db import SessionLocal
+import db.models as models
+from api.milestones import (
+    QUEST_MILESTONES,
+    FRIEND_MILESTONES,
+    LIKE_MILESTONES,
+    VERIFICATION_MILESTONES,
+)
+
+ALEMBIC_INI = os.path.join(os.path.dirname(__file__), "..", "alembic.ini")
+
+
+def alembic_config(configure_logger: bool = True) -> Config:
+    config = Config(ALEMBIC_INI)
+    config.attributes["configure_logger"] = configure_logger
+    return config
+
+
+def migrate(configure_logger: bool = True):
+    # apply every migration not yet applied
+    command.upgrade(alembic_config(configure_logger), "head")
+
+
+def seed(db: Session):
+    """
+    Loads the reference data the app expects. Safe to run on every deploy.
+    """
+    for milestones in (
+        QUEST_MILESTONES,
+        FRIEND_MILESTONES,
+        LIKE_MILESTONES,
+        VERIFICATION_MILESTONES,
+    ):
+        models.Achievements.load_achievements(milestones, db)
+
+    # Fill the friends timelines the first time the table is deployed
+    if db.query(models.FriendTimeline.id).first() is None:
+        models.FriendTimeline.rebuild(db)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prepare the database")
+    parser.add_argument("commands", nargs="+", choices=["migrate", "seed"])
+    args = parser.parse_args()
+
+    for name in args.commands:
+        if name == "migrate":
+            migrate()
+        else:
+            db = SessionLocal()
+            try:
+                seed(db)
+            finally:
+                db.close()
+        print(f"Finished {name}")
@@ -0,0 +1,81 @@
+# Moves image blobs still stored inline in the database into the blob store.
+#
+# Usage: python -m db.manage migrate && python -m db.migrate_blobs [--batch-size 100]
+import argparse
+
+from sqlalchemy.orm import Session
+
+from db import SessionLocal
+from db.blob_store import BlobStore, get_blob_store
+import db.models as models
+
+DEFAULT_BATCH_SIZE = 100
+
+
+def _migrate_column(model, id_column, blob_column, key_column, store, batch_size, db):
+    migrated = 0
+
+    while True:
+        # only pull one batch of blobs into memory at a time
+        rows = (
+            db.query(id_column, blob_column)
+            .filter(key_column.is_(None), blob_column.isnot(None))
+            .order_by(id_column)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return migrated
+
+        for row_id, data in rows:
+            key = store.put_content(data)
+            db.query(model).filter(id_column == row_id).update(
+                {key_column: key, blob_column: None}, synchronize_session=False
+            )
+
+        # commit per batch so an interrupted run resumes where it stopped
+        db.commit()
+        migrated += len(rows)
+
+
+def migrate_blobs(db: Session, store: BlobStore = None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Copies post images and profile pictures into the blob store, sets their
+    keys and clears the inline bytes. Returns the migrated row count per table.
+    """
+    store = store or get_blob_store()
+
+    posts = _migrate_column(
+        models.Posts,
+        models.Posts.id,
+        models.Posts.image,
+        models.Posts.image_key,
+        store,
+        batch_size,
+        db,
+    )
+    users = _migrate_column(
+        models.User,
+        models.User.id,
+        models.User.profile_picture,
+        models.User.profile_picture_key,
+        store,
+        batch_size,
+        db,
+    )
+
+    return {"posts": posts, "users": users}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move image blobs to the blob store")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        migrated = migrate_blobs(db, batch_size=args.batch_size)
+        print(f"Migrated {migrated['posts']} post images")
+        print(f"Migrated {migrated['users']} profile pictures")
+    finally:
+        db.close()
@@ -0,0 +1,350 @@
+"""baseline schema
+
+The schema as the app created it with Base.metadata.create_all. Tables,
+columns and indexes that already exist are left alone, so databases
+created before the migrations were introduced upgrade cleanly.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 22:36:25.805537
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Columns added to existing tables after their first deployment
+ADDED_COLUMNS = {
+    "users": [sa.Column("profile_picture_key", sa.String(length=64), nullable=True)],
+    "posts": [
+        sa.Column("image_key", sa.String(length=64), nullable=True),
+        sa.Column("likes_count", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("dislikes_count", sa.Integer(), server_default="0", nullable=False),
+    ],
+}
+
+RECOUNT_REACTIONS = """
+UPDATE posts SET
+    likes_count = (SELECT count(*) FROM post_reactions
+                   WHERE post_id = posts.id AND reaction_type = 'LIKE'),
+    dislikes_count = (SELECT count(*) FROM post_reactions
+                      WHERE post_id = posts.id AND reaction_type = 'DISLIKE')
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    # the enum type used to be created on its own before create_all
+    postgresql.ENUM("LIKE", "DISLIKE", name="reactiontype").create(
+        op.get_bind(), checkfirst=True
+    )
+
+    if "achievements" not in tables:
+        op.create_table(
+            "achievements",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("description", sa.String(), nullable=False),
+            sa.Column("award_tokens", sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+    if "quests" not in tables:
+        op.create_table(
+            "quests",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("description", sa.String(), nullable=False),
+            sa.Column("image", sa.LargeBinary(), nullable=True),
+            sa.Column("location_long", sa.Float(), nullable=True),
+            sa.Column("location_lat", sa.Float(), nullable=True),
+            sa.Column("points", sa.Integer(), nullable=False),
+            sa.Column("start_date", sa.Date(), nullable=False),
+            sa.Column("end_date", sa.DateTime(), nullable=True),
+            sa.Column("date_posted", sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint("id"),
+        )
+    if "sessions" not in tables:
+        op.create_table(
+            "sessions",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("session_token", sa.String(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("expires_at", sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint("id"),
+        )
+    if "users" not in tables:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("username", sa.String(), nullable=False),
+            sa.Column("password", sa.String(), nullable=False),
+            sa.Column("salt", sa.String(), nullable=False),
+            sa.Column("email", sa.String(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("profile_picture", sa.LargeBinary(), nullable=True),
+            sa.Column("profile_picture_key", sa.String(length=64), nullable=True),
+            sa.Column("date_of_birth", sa.Date(), nullable=True),
+            sa.Column("num_quests_completed", sa.Integer(), nullable=True),
+            sa.Column("tokens", sa.Integer(), nullable=True),
+            sa.Column("is_email_verified", sa.Boolean(), nullable=False),
+            sa.Column("selected_bee", sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("email"),
+            sa.UniqueConstraint("username"),
+        )
+    if "verfication_codes" not in tables:
+        op.create_table(
+            "verfication_codes",
+            sa.Column("code", sa.Integer(), nullable=False),
+            sa.Column("username", sa.String(), nullable=False),
+            sa.Column("valid_until", sa.DateTime(timezone=True), nullable=True),
+            sa.PrimaryKeyConstraint("username"),
+        )
+    if "admins" not in tables:
+        op.create_table(
+            "admins",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(
+                ["user_id"],
+                ["users.id"],
+            ),
+            sa.PrimaryKeyConstraint("id"),
+        )
+    if "banned_users" not in tables:
+        op.create_table(
+            "banned_users",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("banned_at", sa.DateTime(), nullable=True),
+            sa.Column("reason", sa.String(), nullable=False),
+            sa.ForeignKeyConstraint(
+                ["user_id"],
+                ["users.id"],
+            ),
+            sa.PrimaryKeyConstraint("id"),
+        )
+    if "friends" not in tables:
+        op.create_table(
+            "friends",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("friend_id", sa.Integer(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.CheckConstraint("user_id != friend_id", name="_user_not_self"),
+            sa.CheckConstraint("user_id < friend_id", name="_user_not_friend"),
+            sa.ForeignKeyConstraint(
+                ["friend_id"],
+                ["users.id"],
+            ),
+            sa.ForeignKeyConstraint(
+                ["user_id"],
+                ["users.id"],
+            ),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("user_id", "friend_id", name="_user_friend_uc"),
+        )
+    if "user_achievements" not in tables:
+        op.create_table(
+            "user_achievements",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("achievement_id", sa.Integer(), nullable=False),
+            sa.Column("date_achieved", sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(
+                ["achievement_id"],
+                ["achievements.id"],
+            ),
+            sa.ForeignKeyConstraint(
+                ["user_id"],
+                ["users.id"],
+            ),
+            sa.PrimaryKeyConstraint("id"),
+        )
+    if "user_quests" not in tables:
+        op.create_table(
+            "user_quests",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("quest_id", sa.Integer(), nullable=False),
+            sa.Column("is_done", sa.Boolean(), nullable=False),
+            sa.Column("date_completed", sa.DateTime(), nullable=True),
+            sa.Column("is_verified", sa.Boolean(), nullable=False),
+            sa.ForeignKeyConstraint(
+                ["quest_id"],
+                ["quests.id"],
+            ),
+            sa.ForeignKeyConstraint(
+                ["user_id"],
+                ["users.id"],
+            ),
+            sa.PrimaryKeyConstraint("id"),
+        )
+    if "posts" not in tables:
+        op.create_table(
+            "posts",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("caption", sa.String(length=255), nullable=False),
+            sa.Column("image", sa.LargeBinary(), nullable=True),
+            sa.Column("image_key", sa.String(length=64), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("user_quest_id", sa.Integer(), nullable=False),
+            sa.Column("likes_count", sa.Integer(), server_default="0", nullable=False),
+            sa.Column(
+                "dislikes_count", sa.Integer(), server_default="0", nullable=False
+            ),
+            sa.ForeignKeyConstraint(
+                ["user_id"],
+                ["users.id"],
+            ),
+            sa.ForeignKeyConstraint(
+                ["user_quest_id"],
+                ["user_quests.id"],
+            ),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint(
+                "user_quest_id", "user_id", name="_user_quest_user_post_uc"
+            ),
+        )
+    op.create_index(
+        "ix_posts_created_at_id",
+        "posts",
+        ["created_at", "id"],
+        unique=False,
+        if_not_exists=True,
+    )
+    if "quests_verification" not in tables:
+        op.create_table(
+            "quests_verification",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("user_quest_id", sa.Integer(), nullable=False),
+            sa.Column("verifier_id", sa.Integer(), nullable=False),
+            sa.Column("verified_at", sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(
+                ["user_quest_id"],
+                ["user_quests.id"],
+            ),
+            sa.ForeignKeyConstraint(
+                ["verifier_id"],
+                ["users.id"],
+            ),
+            sa.PrimaryKeyConstraint("id"),
+        )
+    if "friend_timeline" not in tables:
+        op.create_table(
+            "friend_timeline",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("post_id", sa.Integer(), nullable=False),
+            sa.Column("author_id", sa.Integer(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(
+                ["author_id"],
+                ["users.id"],
+            ),
+            sa.ForeignKeyConstraint(
+                ["post_id"],
+                ["posts.id"],
+            ),
+            sa.ForeignKeyConstraint(
+                ["user_id"],
+                ["users.id"],
+            ),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("user_id", "post_id", name="_timeline_user_post_uc"),
+        )
+    op.create_index(
+        "ix_friend_timeline_post_id",
+        "friend_timeline",
+        ["post_id"],
+        unique=False,
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_friend_timeline_user_created_post",
+        "friend_timeline",
+        ["user_id", "created_at", "post_id"],
+        unique=False,
+        if_not_exists=True,
+    )
+    if "post_reactions" not in tables:
+        op.create_table(
+            "post_reactions",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("post_id", sa.Integer(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column(
+                "reaction_type",
+                postgresql.ENUM(name="reactiontype", create_type=False),
+                nullable=False,
+            ),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(
+                ["post_id"],
+                ["posts.id"],
+            ),
+            sa.ForeignKeyConstraint(
+                ["user_id"],
+                ["users.id"],
+            ),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("post_id", "user_id", name="_post_user_uc"),
+        )
+    op.create_index(
+        "ix_post_reactions_post_type_created_id",
+        "post_reactions",
+        ["post_id", "reaction_type", "created_at", "id"],
+        unique=False,
+        if_not_exists=True,
+    )
+
+    # bring tables created by an older create_all up to date
+    added = set()
+    for table, columns in ADDED_COLUMNS.items():
+        if table not in tables:
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table)}
+        for column in columns:
+            if column.name not in existing:
+                op.add_column(table, column)
+                added.add(column.name)
+
+    # new counters start from the reactions already stored
+    if "likes_count" in added:
+        op.execute(RECOUNT_REACTIONS)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_post_reactions_post_type_created_id", table_name="post_reactions")
+    op.drop_table("post_reactions")
+    sa.Enum(name="reactiontype").drop(op.get_bind(), checkfirst=True)
+    op.drop_index("ix_friend_timeline_user_created_post", table_name="friend_timeline")
+    op.drop_index("ix_friend_timeline_post_id", table_name="friend_timeline")
+    op.drop_table("friend_timeline")
+    op.drop_table("quests_verification")
+    op.drop_index("ix_posts_created_at_id", table_name="posts")
+    op.drop_table("posts")
+    op.drop_table("user_quests")
+    op.drop_table("user_achievements")
+    op.drop_table("friends")
+    op.drop_table("banned_users")
+    op.drop_table("admins")
+    op.drop_table("verfication_codes")
+    op.drop_table("users")
+    op.drop_table("sessions")
+    op.drop_table("quests")
+    op.drop_table("achievements")
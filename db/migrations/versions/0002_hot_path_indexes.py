@@ -0,0 +1,77 @@
+"""hot path indexes
+
+Indexes for the columns the app filters on. posts.created_at is already
+covered by ix_posts_created_at_id and friends.user_id by _user_friend_uc.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 22:37:05.994508
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f("ix_admins_user_id"), "admins", ["user_id"], unique=False)
+    op.create_index(
+        op.f("ix_banned_users_user_id"), "banned_users", ["user_id"], unique=False
+    )
+    op.create_index(
+        op.f("ix_friends_friend_id"), "friends", ["friend_id"], unique=False
+    )
+    op.create_index("ix_posts_user_id", "posts", ["user_id"], unique=False)
+    op.create_index(
+        op.f("ix_quests_verification_user_quest_id"),
+        "quests_verification",
+        ["user_quest_id"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_quests_verification_verifier_id"),
+        "quests_verification",
+        ["verifier_id"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_user_achievements_user_id"),
+        "user_achievements",
+        ["user_id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_user_quests_quest_id", "user_quests", ["quest_id"], unique=False
+    )
+    op.create_index(
+        "ix_user_quests_user_id_quest_id",
+        "user_quests",
+        ["user_id", "quest_id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_user_quests_user_id_quest_id", table_name="user_quests")
+    op.drop_index("ix_user_quests_quest_id", table_name="user_quests")
+    op.drop_index(op.f("ix_user_achievements_user_id"), table_name="user_achievements")
+    op.drop_index(
+        op.f("ix_quests_verification_verifier_id"), table_name="quests_verification"
+    )
+    op.drop_index(
+        op.f("ix_quests_verification_user_quest_id"), table_name="quests_verification"
+    )
+    op.drop_index("ix_posts_user_id", table_name="posts")
+    op.drop_index(op.f("ix_friends_friend_id"), table_name="friends")
+    op.drop_index(op.f("ix_banned_users_user_id"), table_name="banned_users")
+    op.drop_index(op.f("ix_admins_user_id"), table_name="admins")
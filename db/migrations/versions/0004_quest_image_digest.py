@@ -0,0 +1,37 @@
+"""quest image digest
+
+quests.image_digest keeps the md5 of the image, so revalidating a quest image
+no longer reads and hashes the image itself.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 09:12:40.183517
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "quests", sa.Column("image_digest", sa.String(length=32), nullable=True)
+    )
+    # the digest the ETag was computed from until now, so client caches stay valid
+    op.execute(
+        "UPDATE quests SET image_digest = md5(image) WHERE image IS NOT NULL"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("quests", "image_digest")
@@ -1,16 +1,20 @@
 # This file includes the SQLAlchemy models for the database tables.
+import hashlib
 from random import randint
 import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from io import BytesIO
 from PIL import Image
-from sqlalchemy import func, case, text
-from sqlalchemy.dialects.postgresql import ENUM
+from sqlalchemy import func, case, text, tuple_, select, literal, literal_column
+from sqlalchemy import update, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import ENUM, insert
 import enum
 
 
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Response
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import (
     Column,
     Integer,
@@ -21,22 +25,30 @@ from sqlalchemy import (
     ForeignKey,
     UniqueConstraint,
     CheckConstraint,
+    Index,
     Float,
     Boolean,
     or_,
     and_,
 )
 
-from sqlalchemy.orm import Session, relationship, aliased
+from sqlalchemy.orm import Session, relationship, aliased, deferred, validates
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timezone, timedelta
 from db import Base
+from db.blob_store import get_blob_store
 import base64
 import api.utils as utils
+import api.images as images
+import api.authz as authz
 import db.schemas as schemas
 
 MAX_FILE_SIZE = 5 * 1024 * 1024
 ALLOWED_CONTENT_TYPES = ["image/jpeg", "image/png"]
 
+# Number of a friend's recent posts copied into a timeline on a new friendship
+TIMELINE_BACKFILL_SIZE = 200
+
 
 class User(Base):
     __tablename__ = "users"
@@ -47,9 +59,10 @@ class User(Base):
     salt = Column(String, nullable=False)
     email = Column(String, nullable=False, unique=True)
     created_at = Column(DateTime, default=datetime.now(timezone.utc))
-    profile_picture = Column(
-        LargeBinary, nullable=True
-    )  # Blob field for profile picture
+    # Legacy blob field for profile picture, moved to the blob store. Deferred
+    # so loading a user never pulls the picture along
+    profile_picture = deferred(Column(LargeBinary, nullable=True), group="blobs")
+    profile_picture_key = Column(String(64), nullable=True)  # blob store key
     date_of_birth = Column(Date, nullable=True)
     num_quests_completed = Column(Integer, default=0)
     tokens = Column(Integer, default=0)
@@ -73,10 +86,7 @@ class User(Base):
         )
 
     @staticmethod
-    def create_user(new_user_params: schemas.UserCreate, db):
-        salt = utils.create_salt()
-        hashed_password = utils.hash_password(new_user_params.password, salt)
-
+    def create_user(new_user_params: schemas.UserCreate, hashed_password, salt, db):
         new_user = User(
             username=new_user_params.username,
             email=new_user_params.email,
@@ -94,12 +104,57 @@ class User(Base):
     def get_user(user_id, db):
         return db.query(User).filter(User.id == user_id).first()
 
+    @staticmethod
+    def replace_password_hash(user_id, old_hash, new_hash, salt, db):
+        # skipped if the password changed since old_hash was read
+        db.execute(
+            update(User)
+            .where(User.id == user_id, User.password == old_hash)
+            .values(password=new_hash, salt=salt)
+        )
+        db.commit()
+
+    @staticmethod
+    def get_authorization(user_id, db):
+        # ban and admin status in a single round trip
+        is_banned = select(BannedUsers.id).where(BannedUsers.user_id == user_id)
+        is_admin = select(Admin.id).where(Admin.user_id == user_id)
+        return db.execute(select(is_banned.exists(), is_admin.exists())).one()
+
+    @staticmethod
+    def get_profile_picture_key(username, db):
+        user = (
+            db.query(User.id, User.profile_picture_key)
+            .filter(User.username == username)
+            .first()
+        )
+        if user is None:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        if user.profile_picture_key is not None:
+            return user.profile_picture_key
+
+        # users not yet migrated to the blob store keep the bytes inline
+        data = db.query(User.profile_picture).filter(User.id == user.id).scalar()
+        if data is None:
+            raise HTTPException(status_code=404, detail="Profile picture not found")
+
+        # move the picture to the blob store on first read
+        key = get_blob_store().put_content(data)
+        db.query(User).filter(User.id == user.id).update(
+            {User.profile_picture_key: key, User.profile_picture: None},
+            synchronize_session=False,
+        )
+        db.commit()
+
+        return key
+
 
 class BannedUsers(Base):
     __tablename__ = "banned_users"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     banned_at = Column(DateTime, default=datetime.now(timezone.utc))
 
     reason = Column(String, nullable=False)
@@ -110,6 +165,8 @@ class BannedUsers(Base):
             raise HTTPException(status_code=400, detail="User is already banned")
         banned_user = BannedUsers(user_id=user_id, reason=reason)
         db.add(banned_user)
+
+        authz.invalidate(user_id, db)
         db.commit()
         db.refresh(banned_user)
         return banned_user
@@ -132,26 +189,38 @@ class Admin(Base):
     __tablename__ = "admins"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
 
     def __repr__(self):
         return f"<Admin(id={self.id}, user_id={self.user_id})>"
 
-    @staticmethod
-    def verify_admin(user_id, db):
-        return db.query(Admin).filter(Admin.user_id == user_id).first() is not None
-
 
 class Sessions(Base):
     __tablename__ = "sessions"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False, index=True)
     session_token = Column(String, nullable=False)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     expires_at = Column(
-        DateTime, default=datetime.now(timezone.utc) + timedelta(days=1)
+        DateTime,
+        default=lambda: datetime.now(timezone.utc) + timedelta(days=1),
+        index=True,
     )
 
+    @staticmethod
+    def add_many(sessions, db):
+        # one multi-row insert for the whole batch
+        db.execute(insert(Sessions), sessions)
+        db.commit()
+
+    @staticmethod
+    def prune_expired(db):
+        result = db.execute(
+            delete(Sessions).where(Sessions.expires_at < datetime.now(timezone.utc))
+        )
+        db.commit()
+        return result.rowcount
+
     def __repr__(self):
         return (
             f"<Sessions(id={self.id}, user_id={self.user_id}, session_token={self.session_token}, "
@@ -172,16 +241,26 @@ class Achievements(Base):
 
     @staticmethod
     def load_achievements(milestones: dict, db: Session):
-        for milestone, achievement in milestones.items():
-            new_achievement = Achievements(
-                id=achievement["id"],
-                description=achievement["description"],
-                award_tokens=achievement["award_tokens"],
+        # upsert so seeding can run any number of times
+        statement = insert(Achievements).values(
+            [
+                {
+                    "id": achievement["id"],
+                    "description": achievement["description"],
+                    "award_tokens": achievement["award_tokens"],
+                }
+                for achievement in milestones.values()
+            ]
+        )
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[Achievements.id],
+                set_={
+                    "description": statement.excluded.description,
+                    "award_tokens": statement.excluded.award_tokens,
+                },
             )
-            db.add(new_achievement)
-
-        # Commit the achievements
-        db.commit()
+        )
 
         # Update the sequence to the maximum ID value
         # This ensures future auto-incremented IDs start after your manually set IDs
@@ -195,6 +274,8 @@ class Achievements(Base):
         """
             )
         )
+
+        # Commit the achievements
         db.commit()
 
 
@@ -202,7 +283,7 @@ class UserAchievements(Base):
     __tablename__ = "user_achievements"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     achievement_id = Column(Integer, ForeignKey("achievements.id"), nullable=False)
     date_achieved = Column(DateTime, default=datetime.now(timezone.utc))
 
@@ -219,7 +300,10 @@ class Quests(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String, nullable=False)
     description = Column(String, nullable=False)
-    image = Column(LargeBinary, nullable=True)  # put base64 encoded image here
+    # put base64 encoded image here, deferred so it only loads when asked for
+    image = deferred(Column(LargeBinary, nullable=True), group="blobs")
+    # md5 of image, the ETag of /quests/image/{id}, kept by set_image_digest
+    image_digest = Column(String(32), nullable=True)
     location_long = Column(Float, nullable=True)
     location_lat = Column(Float, nullable=True)
     points = Column(Integer, nullable=False)  # Points awarded for completing the quest
@@ -229,6 +313,47 @@ class Quests(Base):
 
     # Relationships
 
+    @validates("image")
+    def set_image_digest(self, key, image):
+        # computed once per write, revalidation never reads the image
+        self.image_digest = hashlib.md5(image).hexdigest() if image is not None else None
+        return image
+
+    @staticmethod
+    def get_catalog(db):
+        # every quest without its image, only whether it has one
+        return db.execute(
+            select(
+                Quests.id,
+                Quests.name,
+                Quests.description,
+                Quests.location_long,
+                Quests.location_lat,
+                Quests.points,
+                Quests.start_date,
+                Quests.end_date,
+                Quests.image.isnot(None).label("has_image"),
+            ).order_by(Quests.id)
+        ).all()
+
+    @staticmethod
+    def get_image(quest_id, db):
+        # the stored digest doubles as the ETag
+        row = db.execute(
+            select(Quests.image, Quests.image_digest).where(Quests.id == quest_id)
+        ).first()
+        if row is None or row[0] is None:
+            raise HTTPException(status_code=404, detail="Image not found")
+        return row
+
+    @staticmethod
+    def get_image_digest(quest_id, db):
+        # revalidation only needs the digest, the image stays in the database
+        digest = db.scalar(select(Quests.image_digest).where(Quests.id == quest_id))
+        if digest is None:
+            raise HTTPException(status_code=404, detail="Image not found")
+        return digest
+
     def __repr__(self):
         return (
             f"<Quest(id={self.id}, title={self.name}, description={self.description}, "
@@ -243,9 +368,15 @@ class Posts(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     caption = Column(String(255), nullable=False)
-    image = Column(LargeBinary, nullable=True)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
+    # Legacy blob, moved to the blob store. Deferred so loading a post never
+    # pulls the image along
+    image = deferred(Column(LargeBinary, nullable=True), group="blobs")
+    image_key = Column(String(64), nullable=True)  # blob store key
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     user_quest_id = Column(Integer, ForeignKey("user_quests.id"), nullable=False)
+    # Denormalized reaction counts, kept in step by PostReactions
+    likes_count = Column(Integer, nullable=False, default=0, server_default="0")
+    dislikes_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     user = relationship("User", back_populates="posts")
     user_quest = relationship("UserQuests", back_populates="post")
@@ -255,6 +386,9 @@ class Posts(Base):
 
     __table_args__ = (
         UniqueConstraint("user_quest_id", "user_id", name="_user_quest_user_post_uc"),
+        # Serves the keyset-paginated feed without sorting
+        Index("ix_posts_created_at_id", "created_at", "id"),
+        Index("ix_posts_user_id", "user_id"),
     )
 
     def __repr__(self):
@@ -305,28 +439,19 @@ class Posts(Base):
         if len(contents) > MAX_FILE_SIZE:
             raise HTTPException(status_code=400, detail="File size too large")
 
-        # Try to open the image using Pillow
+        # convert to JPEG for consistency and render the feed size variants
         try:
-            image = Image.open(BytesIO(contents))
-            if image.format not in ["JPEG", "PNG"]:
-                raise HTTPException(status_code=400, detail="Invalid file format")
-        except Exception as e:
-            raise HTTPException(status_code=400, detail="Invalid image file")
-
-        # Convert RGBA to RGB
-        if image.mode == "RGBA":
-            image = image.convert("RGB")
-
-        # convert and encode as JPEG for consistency
-        buffer = BytesIO()
-        image.save(buffer, format="JPEG", quality=85)
-        buffer.seek(0)
-        image_data = buffer.getvalue()
+            original, variants = await images.image_pool.run(
+                images.process_image, contents, images.POST_IMAGE_SIZES
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
-        return image_data
+        # store the image outside the database, the post keeps its key
+        return await run_in_threadpool(images.store_image, original, variants)
 
     @staticmethod
-    def create_post_transcation(user_id, quest_id, caption, image_data, db):
+    def create_post_transcation(user_id, quest_id, caption, image_key, db):
         try:
             # create a new user quest and flush to get the id
             new_user_quest = UserQuests(
@@ -342,11 +467,16 @@ class Posts(Base):
             new_post = Posts(
                 user_id=user_id,
                 caption=caption,
-                image=image_data,
+                image_key=image_key,
                 user_quest_id=new_user_quest.id,
             )
 
             db.add(new_post)
+            db.flush()
+
+            # fan the post out to the timelines of the author's friends
+            FriendTimeline.fan_out(new_post, db)
+
             db.commit()
             db.refresh(new_post)
 
@@ -359,103 +489,175 @@ class Posts(Base):
             )
 
     @staticmethod
-    def get_all(db):
-        posts = (
-            db.query(
+    def get_image_key(post_id, db):
+        post = db.query(Posts.id, Posts.image_key).filter(Posts.id == post_id).first()
+        if not post:
+            raise HTTPException(status_code=404, detail="Post not found")
+
+        if post.image_key is not None:
+            return post.image_key
+
+        # posts not yet migrated to the blob store keep the bytes inline
+        data = db.query(Posts.image).filter(Posts.id == post_id).scalar()
+        if not data:
+            raise HTTPException(status_code=404, detail="Image not found")
+
+        # move the image to the blob store on first read
+        key = get_blob_store().put_content(data)
+        db.query(Posts).filter(Posts.id == post_id).update(
+            {Posts.image_key: key, Posts.image: None}, synchronize_session=False
+        )
+        db.commit()
+
+        return key
+
+    @staticmethod
+    async def get_all(db: AsyncSession):
+        query = (
+            select(
                 Posts.id,
                 Posts.user_id,
                 Posts.caption,
                 Posts.created_at,
                 Posts.user_quest_id,
-                func.count(case((PostReactions.reaction_type == "LIKE", 1))).label(
-                    "likes_count"
-                ),
-                func.count(case((PostReactions.reaction_type == "DISLIKE", 1))).label(
-                    "dislikes_count"
-                ),
+                Posts.likes_count,
+                Posts.dislikes_count,
                 User.username,  # Directly joining User to fetch the username
+                UserQuests.quest_id,
+                Quests.name.label("questname"),
             )
-            .outerjoin(PostReactions, PostReactions.post_id == Posts.id)
             .join(User, User.id == Posts.user_id)  # Join the User table directly
-            .group_by(Posts.id, User.id)  # Group by both Posts and User
-            .all()
+            .join(UserQuests, UserQuests.id == Posts.user_quest_id)
+            .join(Quests, Quests.id == UserQuests.quest_id)
         )
 
-        return posts
+        return (await db.execute(query)).all()
 
     @staticmethod
-    def get_by_id(post_id, db):
-        # Get the post by ID
-        post = db.query(Posts).filter(Posts.id == post_id).first()
-
-        # Check if post exists
-        if not post:
-            raise HTTPException(status_code=404, detail="Post not found")
-
-        # Count likes and dislikes for the post
-        likes_count = (
-            db.query(func.count(PostReactions.id))
-            .filter(
-                PostReactions.post_id == post.id, PostReactions.reaction_type == "LIKE"
+    async def get_feed(db: AsyncSession, before=None, limit=None):
+        # Fetch feed rows with the author and quest in one joined query
+        query = (
+            select(
+                Posts.id,
+                Posts.user_id,
+                Posts.caption,
+                Posts.created_at,
+                UserQuests.quest_id,
+                User.username,
             )
-            .scalar()
+            .join(User, User.id == Posts.user_id)
+            .join(UserQuests, UserQuests.id == Posts.user_quest_id)
         )
 
-        dislikes_count = (
-            db.query(func.count(PostReactions.id))
-            .filter(
-                PostReactions.post_id == post.id,
-                PostReactions.reaction_type == "DISLIKE",
-            )
-            .scalar()
-        )
+        # Continue after the (created_at, id) key of the previous page
+        if before is not None:
+            query = query.where(tuple_(Posts.created_at, Posts.id) < before)
 
-        # Get user info
-        username = (db.query(User.username).filter(User.id == post.user_id)).scalar()
+        query = query.order_by(Posts.created_at.desc(), Posts.id.desc())
 
-        # Get quest name
-        quest_name = (
-            db.query(Quests.name)
-            .join(UserQuests, UserQuests.quest_id == Quests.id)
-            .filter(UserQuests.id == post.user_quest_id)
-            .scalar()
-        )
+        if limit is not None:
+            query = query.limit(limit)
+
+        return (await db.execute(query)).all()
+
+    @staticmethod
+    async def get_by_id(post_id, db: AsyncSession):
+        # Get the post metadata with its author and quest, without the image
+        post = (
+            await db.execute(
+                select(
+                    Posts.id,
+                    Posts.user_id,
+                    Posts.caption,
+                    Posts.created_at,
+                    Posts.likes_count,
+                    Posts.dislikes_count,
+                    User.username,
+                    UserQuests.quest_id,
+                    Quests.name.label("questname"),
+                )
+                .join(User, User.id == Posts.user_id)
+                .join(UserQuests, UserQuests.id == Posts.user_quest_id)
+                .join(Quests, Quests.id == UserQuests.quest_id)
+                .where(Posts.id == post_id)
+            )
+        ).first()
 
-        return post, likes_count, dislikes_count, username, quest_name
+        # Check if post exists
+        if not post:
+            raise HTTPException(status_code=404, detail="Post not found")
+
+        return post
 
     @staticmethod
-    def get_by_user(user_id, db):
+    async def get_by_user(user_id, db: AsyncSession):
         # Check if user exists
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.scalar(select(User.id).where(User.id == user_id))
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
-        # Query posts with aggregated likes and dislikes count
-        posts = (
-            db.query(
+        # Query posts with their counters, author and quest in one join
+        query = (
+            select(
                 Posts.id,
                 Posts.user_id,
                 Posts.caption,
                 Posts.created_at,
                 Posts.user_quest_id,
+                Posts.likes_count,
+                Posts.dislikes_count,
+                User.username,
+                UserQuests.quest_id,
+                Quests.name.label("questname"),
+            )
+            .where(Posts.user_id == user_id)
+            .join(User, User.id == Posts.user_id)
+            .join(UserQuests, UserQuests.id == Posts.user_quest_id)
+            .join(Quests, Quests.id == UserQuests.quest_id)
+        )
+
+        return (await db.execute(query)).all()
+
+    @staticmethod
+    def repair_counts(db):
+        """
+        Recomputes likes_count and dislikes_count of every post from
+        post_reactions in one statement. Returns the number of posts fixed.
+        """
+        counts = (
+            select(
+                Posts.id.label("post_id"),
                 func.count(case((PostReactions.reaction_type == "LIKE", 1))).label(
                     "likes_count"
                 ),
                 func.count(case((PostReactions.reaction_type == "DISLIKE", 1))).label(
                     "dislikes_count"
                 ),
-                User.username,
             )
-            .filter(Posts.user_id == user_id)
             .outerjoin(PostReactions, PostReactions.post_id == Posts.id)
-            .join(User, User.id == Posts.user_id)
-            .group_by(
-                Posts.id, User.id
-            )  # Add User.id here to group by both Posts and User
-            .all()
+            .group_by(Posts.id)
+            .subquery()
         )
 
-        return posts
+        # only rows that drifted are written
+        result = db.execute(
+            update(Posts)
+            .where(
+                Posts.id == counts.c.post_id,
+                or_(
+                    Posts.likes_count != counts.c.likes_count,
+                    Posts.dislikes_count != counts.c.dislikes_count,
+                ),
+            )
+            .values(
+                likes_count=counts.c.likes_count,
+                dislikes_count=counts.c.dislikes_count,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+
+        return result.rowcount
 
     @staticmethod
     def update(post_id, caption, current_user, db):
@@ -505,9 +707,19 @@ class PostReactions(Base):
     post_id = Column(Integer, ForeignKey("posts.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     reaction_type = Column(reaction_type_enum, nullable=False)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
-    __table_args__ = (UniqueConstraint("post_id", "user_id", name="_post_user_uc"),)
+    __table_args__ = (
+        UniqueConstraint("post_id", "user_id", name="_post_user_uc"),
+        # Serves the keyset-paginated reactor lists of a post
+        Index(
+            "ix_post_reactions_post_type_created_id",
+            "post_id",
+            "reaction_type",
+            "created_at",
+            "id",
+        ),
+    )
 
     post = relationship("Posts", back_populates="reactions")
     user = relationship("User", back_populates="reactions")
@@ -532,22 +744,6 @@ class PostReactions(Base):
 
         return like
 
-    def unlike_post(self, db):
-        try:
-            response = schemas.PostReactionResponse(
-                id=self.id,
-                user_id=self.user_id,
-                post_id=self.post_id,
-                message="Post unliked successfully",
-            )
-            db.delete(self)
-            db.commit()
-            return response
-        except Exception as e:
-            raise HTTPException(
-                status_code=400, detail=f"Failed to unlike post: {str(e)}"
-            )
-
     @staticmethod
     def is_disliked(post_id, user_id, db):
         dislike = (
@@ -562,143 +758,174 @@ class PostReactions(Base):
 
         return dislike
 
-    def remove_dislike(self, db):
-        try:
-            response = schemas.PostReactionResponse(
-                id=self.id,
-                user_id=self.user_id,
-                post_id=self.post_id,
-                message="Dislike removed successfully",
-            )
-            db.delete(self)
-            db.commit()
-            return response
-        except Exception as e:
-            raise HTTPException(
-                status_code=400, detail=f"Failed to remove dislike: {str(e)}"
+    @staticmethod
+    async def get_user_reactions(user_id, post_ids, db: AsyncSession):
+        # one lookup on the (post_id, user_id) unique index for the whole page
+        reactions = await db.execute(
+            select(PostReactions.post_id, PostReactions.reaction_type).where(
+                PostReactions.user_id == user_id,
+                PostReactions.post_id.in_(post_ids),
             )
+        )
+
+        return {post_id: reaction.value for post_id, reaction in reactions}
 
     @staticmethod
-    def like_post(post_id, user_id, db):
-        new_like = PostReactions(user_id=user_id, post_id=post_id, reaction_type="LIKE")
+    def toggle_reaction(post_id, user_id, reaction_type, db):
+        """
+        Toggles the user's LIKE or DISLIKE on a post in a single statement.
+        The same reaction is removed, no reaction or the opposite one is
+        replaced, and the post counters are adjusted in the same round trip.
+        Returns (reaction id, reacted, likes_count, dislikes_count).
+        """
+        reaction_filter = (
+            PostReactions.post_id == post_id,
+            PostReactions.user_id == user_id,
+            PostReactions.reaction_type == reaction_type,
+        )
 
-        try:
-            db.add(new_like)
-            db.commit()
-            db.refresh(new_like)
+        removed = (
+            delete(PostReactions)
+            .where(*reaction_filter)
+            .returning(PostReactions.id)
+            .cte("removed")
+        )
 
-            response = schemas.PostReactionResponse(
-                id=new_like.id,
-                user_id=new_like.user_id,
-                post_id=new_like.post_id,
-                message="Post liked successfully",
-            )
-            return response
+        # insert unless the same reaction is being removed or the post is gone
+        new_reaction = select(
+            literal(post_id),
+            literal(user_id),
+            literal(reaction_type, reaction_type_enum),
+            literal(datetime.now(timezone.utc), DateTime),
+        ).where(
+            ~select(PostReactions.id).where(*reaction_filter).exists(),
+            select(Posts.id).where(Posts.id == post_id).exists(),
+        )
+        upsert = insert(PostReactions).from_select(
+            ["post_id", "user_id", "reaction_type", "created_at"], new_reaction
+        )
+        # a concurrent tap that already stored the same reaction is a no-op
+        upsert = upsert.on_conflict_do_update(
+            constraint="_post_user_uc",
+            set_={
+                "reaction_type": upsert.excluded.reaction_type,
+                "created_at": upsert.excluded.created_at,
+            },
+            where=PostReactions.reaction_type != upsert.excluded.reaction_type,
+        )
+        # xmax is 0 for inserted rows and set for rows switched from the
+        # opposite reaction
+        upserted = upsert.returning(
+            PostReactions.id, (literal_column("xmax") == 0).label("inserted")
+        ).cte("upserted")
+
+        added = select(func.count()).select_from(upserted).scalar_subquery()
+        switched = (
+            select(func.count())
+            .select_from(upserted)
+            .where(~upserted.c.inserted)
+            .scalar_subquery()
+        )
+        removed_count = select(func.count()).select_from(removed).scalar_subquery()
 
-        except Exception as e:
-            raise HTTPException(
-                status_code=400, detail=f"Failed to like post: {str(e)}"
-            )
+        if reaction_type == "LIKE":
+            counter, other_counter = Posts.likes_count, Posts.dislikes_count
+        else:
+            counter, other_counter = Posts.dislikes_count, Posts.likes_count
 
-    @staticmethod
-    def dislike_post(post_id, user_id, db):
-        new_dislike = PostReactions(
-            user_id=user_id, post_id=post_id, reaction_type="DISLIKE"
+        statement = (
+            update(Posts)
+            .where(Posts.id == post_id)
+            .values(
+                {
+                    counter: counter + added - removed_count,
+                    other_counter: other_counter - switched,
+                }
+            )
+            .returning(
+                func.coalesce(
+                    select(upserted.c.id).scalar_subquery(),
+                    select(removed.c.id).scalar_subquery(),
+                ),
+                added > 0,
+                Posts.likes_count,
+                Posts.dislikes_count,
+            )
         )
 
         try:
-            db.add(new_dislike)
+            result = db.execute(statement).first()
             db.commit()
-            db.refresh(new_dislike)
+        except IntegrityError:
+            # the post was deleted while reacting to it
+            db.rollback()
+            result = None
 
-            response = schemas.PostReactionResponse(
-                id=new_dislike.id,
-                user_id=new_dislike.user_id,
-                post_id=new_dislike.post_id,
-                message="Post disliked successfully",
-            )
-            return response
+        if result is None:
+            raise HTTPException(status_code=404, detail="Post not found")
 
-        except Exception as e:
-            raise HTTPException(
-                status_code=400, detail=f"Failed to dislike post: {str(e)}"
-            )
+        reaction_id, reacted, likes_count, dislikes_count = result
+        if reaction_id is None:
+            # a concurrent tap stored the same reaction first, report it as set
+            reaction_id = db.query(PostReactions.id).filter(*reaction_filter).scalar()
+            reacted = reaction_id is not None
+
+        return reaction_id, reacted, likes_count, dislikes_count
 
     @staticmethod
-    def get_likedby(post_id, db):
-        users = (
-            db.query(User)
-            .join(PostReactions)
-            .filter(
+    async def get_reactors(
+        post_id, reaction_type, db: AsyncSession, before=None, limit=None
+    ):
+        # check if post exists
+        post = await db.scalar(select(Posts.id).where(Posts.id == post_id))
+        if post is None:
+            raise HTTPException(status_code=404, detail="Post not found")
+
+        # only the user columns the list shows, newest reaction first
+        query = (
+            select(
+                PostReactions.id.label("reaction_id"),
+                PostReactions.created_at,
+                User.id,
+                User.username,
+            )
+            .join(User, User.id == PostReactions.user_id)
+            .where(
                 PostReactions.post_id == post_id,
-                PostReactions.reaction_type == "LIKE",
+                PostReactions.reaction_type == reaction_type,
             )
-            .all()
         )
 
-        return users
-
-    @staticmethod
-    def get_dislikedby(post_id, db):
-        users = (
-            db.query(User)
-            .join(PostReactions)
-            .filter(
-                PostReactions.post_id == post_id,
-                PostReactions.reaction_type == "DISLIKE",
+        # Continue after the (created_at, id) key of the previous page
+        if before is not None:
+            query = query.where(
+                tuple_(PostReactions.created_at, PostReactions.id) < before
             )
-            .all()
-        )
 
-        return users
+        query = query.order_by(PostReactions.created_at.desc(), PostReactions.id.desc())
+
+        if limit is not None:
+            query = query.limit(limit)
+
+        return (await db.execute(query)).all()
 
     @staticmethod
     def get_likes_count(post_id, db):
-        # check if post exists
-        post = db.query(Posts).filter(Posts.id == post_id).first()
-        if not post:
+        # the count is kept on the post, no need to scan the reactions
+        count = db.query(Posts.likes_count).filter(Posts.id == post_id).scalar()
+        if count is None:
             raise HTTPException(status_code=404, detail="Post not found")
 
-        # count the number of likes for a post
-        try:
-            count = (
-                db.query(PostReactions)
-                .filter(
-                    PostReactions.post_id == post_id,
-                    PostReactions.reaction_type == "LIKE",
-                )
-                .count()
-            )
-            return count
-
-        except Exception as e:
-            raise HTTPException(
-                status_code=400, detail=f"Failed to get likes count: {str(e)}"
-            )
+        return count
 
     @staticmethod
     def get_dislikes_count(post_id, db):
-        # check if post exists
-        post = db.query(Posts).filter(Posts.id == post_id).first()
-        if not post:
+        # the count is kept on the post, no need to scan the reactions
+        count = db.query(Posts.dislikes_count).filter(Posts.id == post_id).scalar()
+        if count is None:
             raise HTTPException(status_code=404, detail="Post not found")
 
-        # count the number of dislikes for a post
-        try:
-            count = (
-                db.query(PostReactions)
-                .filter(
-                    PostReactions.post_id == post_id,
-                    PostReactions.reaction_type == "DISLIKE",
-                )
-                .count()
-            )
-            return count
-
-        except Exception as e:
-            raise HTTPException(
-                status_code=400, detail=f"Failed to get dislikes count: {str(e)}"
-            )
+        return count
 
 
 class EmailVerificationCode(Base):
@@ -820,18 +1047,18 @@ class UserQuests(Base):
         "Posts", back_populates="user_quest", cascade="all, delete-orphan"
     )
 
+    __table_args__ = (
+        # Serves lookups by user and by user and quest
+        Index("ix_user_quests_user_id_quest_id", "user_id", "quest_id"),
+        Index("ix_user_quests_quest_id", "quest_id"),
+    )
+
     def __repr__(self):
         return (
             f"<UserQuests(id={self.id}, user_id={self.user_id}, quest_id={self.quest_id}, is_done={self.is_done}, "
             f"date_completed={self.date_completed}, is_verified={self.is_verified} )>"
         )
 
-    @staticmethod
-    def get_quest_id(user_quest_id: int, db: Session):
-        # get user quest object
-        user_quest = db.query(UserQuests).filter(UserQuests.id == user_quest_id).first()
-        return user_quest.quest_id
-
     @staticmethod
     def delete(post_id: int, user_id: int, db: Session):
         # get the post by id
@@ -855,6 +1082,7 @@ class UserQuests(Base):
 
         # delete the post
         try:
+            FriendTimeline.remove_post(post.id, db)
             db.delete(user_quest)
             db.commit()
             return {"detail": "Post and UserQuest deleted successfully"}
@@ -869,8 +1097,10 @@ class QuestVerification(Base):
     __tablename__ = "quests_verification"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_quest_id = Column(Integer, ForeignKey("user_quests.id"), nullable=False)
-    verifier_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_quest_id = Column(
+        Integer, ForeignKey("user_quests.id"), nullable=False, index=True
+    )
+    verifier_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     verified_at = Column(DateTime, default=datetime.now(timezone.utc))
 
     def __repr__(self):
@@ -885,7 +1115,8 @@ class Friends(Base):
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    friend_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # lookups by user_id are served by the (user_id, friend_id) unique index
+    friend_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.now(timezone.utc))
 
     # relationships
@@ -908,21 +1139,35 @@ class Friends(Base):
         if user_id == friend_id:
             return False
 
-        # sort the user and friend IDs to ensure consistency
-        user, friend = sorted([user_id, friend_id])
-
         # Check if the users are already friends
-        response = (
-            db.query(Friends)
-            .filter(Friends.user_id == user, Friends.friend_id == friend)
-            .first()
-        )
+        response = db.execute(Friends._friendship_query(user_id, friend_id)).first()
 
         if response is None:
             return False
 
         return True
 
+    @staticmethod
+    async def check_friendship(user_id: int, friend_id: int, db: AsyncSession) -> bool:
+        # Ensure that the user and friend are not the same
+        if user_id == friend_id:
+            return False
+
+        response = (
+            await db.execute(Friends._friendship_query(user_id, friend_id))
+        ).first()
+
+        return response is not None
+
+    @staticmethod
+    def _friendship_query(user_id: int, friend_id: int):
+        # sort the user and friend IDs to ensure consistency
+        user, friend = sorted([user_id, friend_id])
+
+        return select(Friends.id).where(
+            Friends.user_id == user, Friends.friend_id == friend
+        )
+
     @staticmethod
     def create_friend(user_id, friend_id, db) -> "Friends":
         # check if the user is a user
@@ -955,6 +1200,7 @@ class Friends(Base):
         # add and commit the friend to the database
         try:
             db.add(new_friendship)
+            FriendTimeline.backfill(user_id, friend_id, db)
             db.commit()
             db.refresh(new_friendship)
 
@@ -1002,6 +1248,7 @@ class Friends(Base):
         # remove the friend
         try:
             db.delete(friendship)
+            FriendTimeline.evict(user_id, friend_id, db)
             db.commit()
             return {"detail": "Friend removed successfully"}
 
@@ -1010,38 +1257,172 @@ class Friends(Base):
             raise HTTPException(status_code=500, detail=f"Failed to remove friend {e}")
 
     @staticmethod
-    def get_friends(user_id, db):
+    async def get_friends(user_id, db: AsyncSession):
         # Check if the user exists
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.scalar(select(User.id).where(User.id == user_id))
 
         if user is None:
             raise HTTPException(status_code=404, detail="User not found")
 
-        # Get all friends with additional details
-        friendships = (
-            db.query(Friends)
+        # Get all friends with their usernames in one query, the friend is
+        # whichever side of the friendship is not the user
+        friend_id = case(
+            (Friends.user_id == user_id, Friends.friend_id), else_=Friends.user_id
+        )
+        friendships = await db.execute(
+            select(Friends.id, friend_id.label("friend_id"), User.username)
+            .join(User, User.id == friend_id)
+            .where((Friends.user_id == user_id) | (Friends.friend_id == user_id))
+        )
+
+        return [
+            {
+                "id": friendship.id,
+                "friend_id": friendship.friend_id,
+                "username": friendship.username,
+                "profile_picture_url": f"/users/profile_picture/{friendship.username}",
+            }
+            for friendship in friendships
+        ]
+
+    @staticmethod
+    def count_friends(user_id: int, db: Session) -> int:
+        return (
+            db.query(func.count(Friends.id))
             .filter((Friends.user_id == user_id) | (Friends.friend_id == user_id))
-            .all()
+            .scalar()
         )
 
-        # Process friends to include binary profile picture
-        friends_details = []
-        for friendship in friendships:
-            if friendship.user_id == user_id:
-                friend_id = friendship.friend.id
-                username = friendship.friend.username
-            else:
-                friend_id = friendship.user.id
-                username = friendship.user.username
 
-            # Append the processed friend data
-            friends_details.append(
-                {
-                    "id": friendship.id,
-                    "friend_id": friend_id,
-                    "username": username,
-                    "profile_picture_url": f"/users/profile_picture/{username}",
-                }
+class FriendTimeline(Base):
+    """
+    Materialized friends feed: one row per post in the timeline of each of
+    the author's friends, written when the post or the friendship is created.
+    """
+
+    __tablename__ = "friend_timeline"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    post_id = Column(Integer, ForeignKey("posts.id"), nullable=False)
+    author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "post_id", name="_timeline_user_post_uc"),
+        # Serves a keyset-paginated timeline page with one index range scan
+        Index("ix_friend_timeline_user_created_post", "user_id", "created_at", "post_id"),
+        Index("ix_friend_timeline_post_id", "post_id"),
+    )
+
+    def __repr__(self):
+        return (
+            f"<FriendTimeline(id={self.id}, user_id={self.user_id}, post_id={self.post_id}, "
+            f"author_id={self.author_id}, created_at={self.created_at})>"
+        )
+
+    @staticmethod
+    def _insert(rows):
+        return (
+            insert(FriendTimeline)
+            .from_select(["user_id", "post_id", "author_id", "created_at"], rows)
+            .on_conflict_do_nothing(constraint="_timeline_user_post_uc")
+        )
+
+    @staticmethod
+    def fan_out(post: "Posts", db: Session):
+        # the reader is whichever side of the friendship is not the author
+        reader_id = case(
+            (Friends.user_id == post.user_id, Friends.friend_id),
+            else_=Friends.user_id,
+        )
+        rows = select(
+            reader_id,
+            literal(post.id),
+            literal(post.user_id),
+            literal(post.created_at, DateTime),
+        ).where((Friends.user_id == post.user_id) | (Friends.friend_id == post.user_id))
+
+        db.execute(FriendTimeline._insert(rows))
+
+    @staticmethod
+    def backfill(user_id: int, friend_id: int, db: Session):
+        # copy the most recent posts of each friend into the other's timeline
+        for reader_id, author_id in ((user_id, friend_id), (friend_id, user_id)):
+            rows = (
+                select(literal(reader_id), Posts.id, Posts.user_id, Posts.created_at)
+                .where(Posts.user_id == author_id)
+                .order_by(Posts.created_at.desc(), Posts.id.desc())
+                .limit(TIMELINE_BACKFILL_SIZE)
             )
+            db.execute(FriendTimeline._insert(rows))
+
+    @staticmethod
+    def evict(user_id: int, friend_id: int, db: Session):
+        db.query(FriendTimeline).filter(
+            or_(
+                and_(
+                    FriendTimeline.user_id == user_id,
+                    FriendTimeline.author_id == friend_id,
+                ),
+                and_(
+                    FriendTimeline.user_id == friend_id,
+                    FriendTimeline.author_id == user_id,
+                ),
+            )
+        ).delete(synchronize_session=False)
+
+    @staticmethod
+    def remove_post(post_id: int, db: Session):
+        db.query(FriendTimeline).filter(FriendTimeline.post_id == post_id).delete(
+            synchronize_session=False
+        )
+
+    @staticmethod
+    def rebuild(db: Session):
+        # regenerate every timeline from the current friendships and posts
+        db.query(FriendTimeline).delete(synchronize_session=False)
+
+        for reader_column, author_column in (
+            (Friends.user_id, Friends.friend_id),
+            (Friends.friend_id, Friends.user_id),
+        ):
+            rows = select(
+                reader_column, Posts.id, Posts.user_id, Posts.created_at
+            ).join(Posts, Posts.user_id == author_column)
+            db.execute(FriendTimeline._insert(rows))
+
+        db.commit()
+
+    @staticmethod
+    async def get_feed(user_id: int, db: AsyncSession, before=None, limit=None):
+        query = (
+            select(
+                Posts.id,
+                Posts.user_id,
+                Posts.caption,
+                Posts.created_at,
+                UserQuests.quest_id,
+                User.username,
+            )
+            .select_from(FriendTimeline)
+            .join(Posts, Posts.id == FriendTimeline.post_id)
+            .join(User, User.id == FriendTimeline.author_id)
+            .join(UserQuests, UserQuests.id == Posts.user_quest_id)
+            .where(FriendTimeline.user_id == user_id)
+        )
+
+        # Continue after the (created_at, post_id) key of the previous page
+        if before is not None:
+            query = query.where(
+                tuple_(FriendTimeline.created_at, FriendTimeline.post_id) < before
+            )
+
+        query = query.order_by(
+            FriendTimeline.created_at.desc(), FriendTimeline.post_id.desc()
+        )
+
+        if limit is not None:
+            query = query.limit(limit)
 
-        return friends_details
+        return (await db.execute(query)).all()
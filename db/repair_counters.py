@@ -0,0 +1,14 @@
+# Recomputes the denormalized like and dislike counters of every post.
+#
+# Usage: python -m db.repair_counters
+from db import SessionLocal
+import db.models as models
+
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        repaired = models.Posts.repair_counts(db)
+        print(f"Repaired the counters of {repaired} posts")
+    finally:
+        db.close()
@@ -156,8 +156,25 @@ class PostReactionCreate(BaseModel):
 
 
 class PostReactionResponse(PostReactionBase):
-    id: int  # autoincrement id
+    id: Optional[int] = None  # unset if a concurrent request removed the reaction
     message: Optional[str] = None
+    reacted: Optional[bool] = None  # whether the reaction is now set
+    likes_count: Optional[int] = None
+    dislikes_count: Optional[int] = None
+
+    class Config:
+        orm_mode = True
+
+
+class ReactorResponse(BaseModel):
+    id: int  # user id
+    username: str
+    profile_picture_url: str
+
+
+class MyReactionResponse(BaseModel):
+    post_id: int
+    reaction: Optional[str] = None  # LIKE, DISLIKE or unset
 
     class Config:
         orm_mode = True
@@ -180,21 +197,29 @@ class QuestBase(BaseModel):
     points: int
     start_date: date
     end_date: date
-    image: bytes
 
 
 class QuestCreate(QuestBase):
+    image: bytes
+
     class Config:
         orm_mode = True
 
 
 class QuestRead(QuestBase):
+    # metadata only, the image is served by /quests/image/{id}
     id: int
+    image_url: Optional[str] = None
 
     class Config:
         orm_mode = True
 
 
+class QuestReadWithImage(QuestRead):
+    # for clients that still read the image inline, see ?include=image
+    image: Optional[bytes] = None
+
+
 class QuestDelete(BaseModel):
     id: int
 
@@ -459,3 +459,44 @@ class FriendBehavior(HttpUser):
                 response = self.client.delete(f"/friends/{friend_id}", headers=self.headers)
                 if response.status_code != 200:
                     print(f"Failed to remove friend, Status Code: {response.status_code}, Response: {response.text}")
+
+
+class ConcurrentRoutesBehavior(HttpUser):
+    """
+    Mixes routes that used to block the event loop (bcrypt, image reads,
+    profile updates) with cheap reads, compare the p99 of the cheap reads.
+    """
+    wait_time = between(0.1, 0.5)
+
+    def on_start(self):
+        user = UserPool.get_random_user()
+        if user and user["token"]:
+            self.username = user["username"]
+            self.password = user["password"]
+            self.headers = {"Authorization": f"Bearer {user['token']}"}
+
+    @task(1)
+    def update_password(self):
+        if hasattr(self, 'headers'):
+            self.client.put("/users/update/password",
+                            params={"password": self.password},
+                            headers=self.headers)
+
+    @task(1)
+    def update_email(self):
+        if hasattr(self, 'headers'):
+            self.client.put("/users/update/email",
+                            params={"email": f"{self.username}@example.com"},
+                            headers=self.headers)
+
+    @task(3)
+    def get_profile_picture(self):
+        if hasattr(self, 'headers'):
+            self.client.get(f"/users/profile_picture/{self.username}",
+                            name="/users/profile_picture/[username]")
+
+    @task(5)
+    def read_feed(self):
+        self.client.get("/feed")
+
+    tasks = {update_password: 1, update_email: 1, get_profile_picture: 3, read_feed: 5}
@@ -1,20 +1,27 @@
+import os
+import re
+import tempfile
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+# Keep blobs written by the tests out of the working tree
+os.environ.setdefault("BLOB_STORE_PATH", tempfile.mkdtemp(prefix="blobs-"))
+
+# The test client runs every request on a new event loop, so async connections
+# cannot be pooled across requests
+os.environ.setdefault("DB_ASYNC_POOL", "null")
 
 import api
 from api import app
 
 import db
-from db import get_db, models
-from api.milestones import (
-    QUEST_MILESTONES,
-    FRIEND_MILESTONES,
-    LIKE_MILESTONES,
-    VERIFICATION_MILESTONES,
-)
+from db import get_db, manage, models
 
-# Initialize the database
-db.Base.metadata.create_all(bind=db.engine)
+# Initialize the database as a deployment does
+manage.migrate(configure_logger=False)
+with db.SessionLocal() as session:
+    manage.seed(session)
 
 
 @pytest.fixture
@@ -26,3 +33,46 @@ def db_session():
 def client(db_session):
     return TestClient(app)
     app.dependency_overrides[get_db] = lambda: db_session
+
+
+@pytest.fixture
+def count_queries():
+    """
+    Collects every SQL statement sent to the database while the test runs.
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        statements.append(statement)
+
+    engines = [db.engine, db.async_engine.sync_engine]
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    for engine in engines:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+# image columns that must only be read by the image endpoints
+BLOB_COLUMNS = re.compile(r"\b(posts\.image|users\.profile_picture|quests\.image)\b")
+
+
+@pytest.fixture
+def blob_loads(count_queries):
+    """
+    Collects the SELECT statements that read an image blob column.
+    """
+
+    class BlobLoads:
+        def clear(self):
+            count_queries.clear()
+
+        def __iter__(self):
+            return iter(
+                statement
+                for statement in count_queries
+                if statement.lstrip().upper().startswith("SELECT")
+                and BLOB_COLUMNS.search(statement)
+            )
+
+    return BlobLoads()
@@ -0,0 +1,141 @@
+import asyncio
+import queue
+import time
+from datetime import datetime, timedelta
+import jwt
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+import api.auth as auth
+import api.authz as authz
+import api.pubsub as pubsub
+from api.cache import TTLCache
+from tests.test_users import create_and_login_user
+
+
+def test_ttl_cache_evicts_and_expires():
+    cache = TTLCache("test_cache", maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+
+    # "b" is now the least recently used entry
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    cache.set("d", 4, ttl=-1)
+    assert cache.get("d") is None
+    cache.delete("a")
+    assert cache.get("a") is None
+
+
+def test_token_uses_numeric_exp():
+    payload = jwt.decode(auth.generate_jwt(42), auth.SECRET_KEY, algorithms=["HS256"])
+    assert isinstance(payload["exp"], int)
+    assert "expires" not in payload
+
+
+def test_decoded_token_is_cached(monkeypatch):
+    token = auth.generate_jwt(42)
+    assert auth.decode_token(token) == 42
+
+    # a cached token is not decoded again
+    def fail(*args, **kwargs):
+        raise AssertionError("token decoded twice")
+
+    monkeypatch.setattr(auth.jwt, "decode", fail)
+    assert auth.decode_token(token) == 42
+
+
+def test_expired_and_invalid_tokens_rejected():
+    expired = jwt.encode(
+        {"user_id": 42, "exp": int(time.time()) - 10},
+        auth.SECRET_KEY,
+        algorithm="HS256",
+    )
+    with pytest.raises(HTTPException) as error:
+        auth.decode_token(expired)
+    assert error.value.detail == "Token has expired!"
+
+    with pytest.raises(HTTPException) as error:
+        auth.decode_token("not-a-token")
+    assert error.value.detail == "Invalid token!"
+    assert auth.token_cache.get("not-a-token") is None
+
+
+def test_legacy_expires_claim_still_accepted():
+    def legacy_token(expires):
+        payload = {"user_id": 7, "expires": expires.strftime(auth.LEGACY_FORMAT)}
+        return jwt.encode(payload, auth.SECRET_KEY, algorithm="HS256")
+
+    valid = legacy_token(datetime.utcnow() + timedelta(hours=1))
+    assert auth.decode_token(valid) == 7
+
+    with pytest.raises(HTTPException):
+        auth.decode_token(legacy_token(datetime.utcnow() - timedelta(hours=1)))
+
+
+def test_banned_user_rejected_after_login(client, db_session):
+    user, jwt_token = create_and_login_user(client, db_session)
+    _, admin_jwt = create_and_login_user(client, db_session)
+    headers = {"Authorization": f"Bearer {jwt_token}"}
+
+    # the status is cached by the first request
+    assert client.get("/user_info", headers=headers).status_code == 200
+    assert authz.authz_cache.get(user.json()["id"]) == (False, False)
+
+    response = client.post(
+        f"/ban_user/{user.json()['id']}",
+        params={"reason": "spam"},
+        headers={"Authorization": f"Bearer {admin_jwt}"},
+    )
+    assert response.status_code == 200
+
+    response = client.get("/user_info", headers=headers)
+    assert response.status_code == 403
+    assert response.json()["detail"] == "User is banned"
+
+
+def test_authorization_is_cached(client, db_session, count_queries):
+    _, jwt_token = create_and_login_user(client, db_session)
+    headers = {"Authorization": f"Bearer {jwt_token}"}
+    client.get("/user_info", headers=headers)
+
+    count_queries.clear()
+    assert client.get("/user_info", headers=headers).json()["is_admin"] is False
+    assert not [
+        statement
+        for statement in count_queries
+        if "banned_users" in statement or "admins" in statement
+    ]
+
+
+def test_pubsub_delivers_committed_messages(db_session, monkeypatch):
+    monkeypatch.setattr(pubsub, "PUBSUB", True)
+    received = queue.Queue()
+    pubsub.subscribe("test_channel", received.put)
+    try:
+        assert pubsub.start().wait(5)
+
+        # nothing is sent for a rolled back transaction
+        pubsub.publish("test_channel", "dropped", db_session)
+        db_session.rollback()
+        pubsub.publish("test_channel", "42", db_session)
+        db_session.commit()
+
+        assert received.get(timeout=5) == "42"
+    finally:
+        pubsub.stop()
+
+
+def test_cached_authorization_opens_no_session(monkeypatch):
+    token = auth.generate_jwt(4242)
+    authz.authz_cache.set(4242, authz.Authorization(False, False))
+
+    def fail():
+        raise AssertionError("session opened on a cache hit")
+
+    monkeypatch.setattr(authz, "AsyncSessionLocal", fail)
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    assert asyncio.run(auth.decode_jwt(credentials)) == 4242
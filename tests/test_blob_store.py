@@ -0,0 +1,136 @@
+import os
+import threading
+import boto3
+import moto
+from tests.test_users import create_and_login_user
+from tests.test_feed import create_random_post
+from db import models
+from db.blob_store import LocalBlobStore, S3BlobStore, content_key, get_blob_store
+from db.migrate_blobs import migrate_blobs
+
+
+def test_local_blob_store(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+
+    key = store.put_content(b"image bytes")
+    assert key == content_key(b"image bytes")
+    assert store.exists(key)
+    assert store.get(key) == b"image bytes"
+
+    # identical content is stored once under the same key
+    assert store.put_content(b"image bytes") == key
+    assert store.get("0" * 64) is None
+
+
+def test_local_blob_store_concurrent_put(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    data = b"image bytes" * 100000
+    start = threading.Barrier(8)
+    errors = []
+
+    def put():
+        start.wait()
+        try:
+            store.put_content(data)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=put) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert store.get(content_key(data)) == data
+    # no temporary files are left behind
+    assert os.listdir(os.path.dirname(store._path(content_key(data)))) == [
+        content_key(data)
+    ]
+
+
+def test_s3_blob_store():
+    with moto.mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="blobs")
+        store = S3BlobStore("blobs", prefix="images/")
+
+        key = store.put_content(b"image bytes")
+        assert store.exists(key)
+        assert store.get(key) == b"image bytes"
+        assert not store.exists("0" * 64)
+        assert store.get("0" * 64) is None
+
+
+def test_post_image_stored_by_key(client, db_session):
+    user, jwt = create_and_login_user(client, db_session)
+    post_id = create_random_post(client, db_session, jwt).json()["id"]
+
+    post = db_session.query(models.Posts).filter(models.Posts.id == post_id).first()
+    assert post.image is None
+    assert post.image_key is not None
+
+
+def test_migrate_blobs(client, db_session, tmp_path):
+    user, jwt = create_and_login_user(client, db_session)
+    post_id = create_random_post(client, db_session, jwt).json()["id"]
+
+    # move the stored image back inline as it was before the blob store
+    post = db_session.query(models.Posts).filter(models.Posts.id == post_id).first()
+    post.image = get_blob_store().get(post.image_key)
+    post.image_key = None
+    db_session.commit()
+
+    store = LocalBlobStore(str(tmp_path))
+    migrated = migrate_blobs(db_session, store=store, batch_size=1)
+    assert migrated["posts"] >= 1
+
+    db_session.refresh(post)
+    assert post.image is None
+    assert store.get(post.image_key) is not None
+
+
+def test_legacy_image_migrated_on_read(client, db_session):
+    user, jwt = create_and_login_user(client, db_session)
+    post_id = create_random_post(client, db_session, jwt).json()["id"]
+
+    post = db_session.query(models.Posts).filter(models.Posts.id == post_id).first()
+    image_key = post.image_key
+    post.image = get_blob_store().get(image_key)
+    post.image_key = None
+    db_session.commit()
+
+    response = client.get(f"/posts/image/{post_id}")
+    assert response.status_code == 200
+    assert response.headers["etag"] == f'"{image_key}"'
+
+    db_session.refresh(post)
+    assert post.image is None
+    assert post.image_key == image_key
+
+
+def test_metadata_queries_skip_blobs(client, db_session, blob_loads):
+    user, jwt = create_and_login_user(client, db_session)
+    friend, friend_jwt = create_and_login_user(client, db_session)
+    headers = {"Authorization": f"Bearer {jwt}"}
+    post_id = create_random_post(client, db_session, jwt).json()["id"]
+
+    # existence and ownership checks must not pull image bytes along
+    blob_loads.clear()
+    client.post(f"/posts/like/{post_id}", headers=headers)
+    client.get(f"/posts/like/{post_id}", headers=headers)
+    client.get(f"/posts/dislike/{post_id}", headers=headers)
+    client.get(f"/posts/likedby/{post_id}", headers=headers)
+    client.get(f"/posts/{post_id}", headers=headers)
+    client.get("/posts", headers=headers)
+    client.put(f"/posts/{post_id}", json={"caption": "Edited"}, headers=headers)
+    client.post(f"/friends/{friend.json()['id']}", headers=headers)
+    client.get("/friends", headers=headers)
+    client.get(f"/users/{user.json()['id']}", headers=headers)
+    client.delete(f"/posts/{post_id}", headers=headers)
+    assert list(blob_loads) == []
+
+    # the image endpoint reads the blob store, not the database column
+    post_id = create_random_post(client, db_session, jwt).json()["id"]
+    blob_loads.clear()
+    assert client.get(f"/posts/image/{post_id}").status_code == 200
+    assert list(blob_loads) == []
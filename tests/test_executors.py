@@ -0,0 +1,134 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from fastapi import HTTPException
+from io import BytesIO
+from PIL import Image
+import api.images as images
+import api.utils as utils
+from db import models
+from db.blob_store import get_blob_store
+from tests.test_feed import create_random_post
+from tests.test_quest import create_random_quest
+from api.executors import BoundedExecutor
+from tests.test_users import create_and_login_user, create_random_image
+
+
+def test_bounded_executor_rejects_when_full():
+    pool = BoundedExecutor("test_pool", ThreadPoolExecutor, 1, 1)
+    release = threading.Event()
+
+    async def scenario():
+        # one job runs and one waits, the third is turned away
+        running = asyncio.ensure_future(pool.run(release.wait))
+        waiting = asyncio.ensure_future(pool.run(release.wait))
+        await asyncio.sleep(0.05)
+
+        with pytest.raises(HTTPException) as exc_info:
+            await pool.run(release.wait)
+        assert exc_info.value.status_code == 503
+
+        release.set()
+        assert await asyncio.gather(running, waiting) == [True, True]
+
+        # capacity is available again once the jobs finished
+        assert await pool.run(sum, [1, 2]) == 3
+
+    asyncio.run(scenario())
+    pool.shutdown()
+
+
+def test_image_pool_metrics(client, db_session):
+    user_create_response, jwt_token = create_and_login_user(client, db_session)
+
+    response = client.post(
+        "/users/profile_picture/upload",
+        files={"profile_picture": ("test.png", create_random_image(50, 50), "image/png")},
+        headers={"Authorization": f"Bearer {jwt_token}"},
+    )
+    assert response.status_code == 200
+
+    metrics = client.get(
+        "/metrics", headers={"Authorization": f"Bearer {jwt_token}"}
+    ).json()
+    assert metrics["gauges"]["image_pool.queue_depth"] == 0
+    assert metrics["timings"]["image_pool.processing_time"]["count"] >= 1
+    assert "image_pool.queue_time" in metrics["timings"]
+
+
+def test_metrics_require_authentication(client):
+    assert client.get("/metrics").status_code in (401, 403)
+
+
+def test_image_pool_uses_forkserver():
+    assert images.image_pool.executor_kwargs["mp_context"].get_start_method() == (
+        "forkserver"
+    )
+
+
+def test_password_pool_metrics(client, db_session):
+    _, jwt_token = create_and_login_user(client, db_session)
+
+    metrics = client.get(
+        "/metrics", headers={"Authorization": f"Bearer {jwt_token}"}
+    ).json()
+    assert metrics["gauges"]["password_pool.in_flight"] == 0
+    assert metrics["timings"]["password_pool.processing_time"]["count"] >= 2
+    assert "password_pool.queue_time" in metrics["timings"]
+
+
+def test_login_rejected_when_password_pool_full(client, db_session, monkeypatch):
+    user_create_response, _ = create_and_login_user(client, db_session)
+
+    # a pool without capacity turns every job away
+    full_pool = BoundedExecutor("password_pool", ThreadPoolExecutor, 0, 0)
+    monkeypatch.setattr(utils, "password_pool", full_pool)
+
+    response = client.post(
+        "/users/login",
+        json={"username": user_create_response.json()["username"], "password": "password"},
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_post_rejected_when_image_pool_full(client, db_session, monkeypatch):
+    _, jwt_token = create_and_login_user(client, db_session)
+    quest_id = create_random_quest(client, db_session, jwt_token).json()["id"]
+
+    full_pool = BoundedExecutor("image_pool", ThreadPoolExecutor, 0, 0)
+    monkeypatch.setattr(images, "image_pool", full_pool)
+
+    response = client.post(
+        "/posts",
+        data={"caption": "busy", "quest_id": str(quest_id)},
+        files={"image": ("test.png", create_random_image(50, 50), "image/png")},
+        headers={"Authorization": f"Bearer {jwt_token}"},
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_missing_variant_rendered_on_image_pool(client, db_session):
+    user, jwt_token = create_and_login_user(client, db_session)
+    post_id = create_random_post(client, db_session, jwt_token).json()["id"]
+
+    # an upload from before variants existed, only the original is stored
+    original = BytesIO()
+    Image.new("RGB", (960, 480)).save(original, format="JPEG")
+    post = db_session.get(models.Posts, post_id)
+    post.image_key = get_blob_store().put_content(original.getvalue())
+    db_session.commit()
+
+    def rendered():
+        timings = client.get(
+            "/metrics", headers={"Authorization": f"Bearer {jwt_token}"}
+        ).json()["timings"]
+        return timings.get("image_pool.processing_time", {"count": 0})["count"]
+
+    before = rendered()
+    response = client.get(f"/posts/image/{post_id}", params={"size": 480})
+    assert response.status_code == 200
+    assert Image.open(BytesIO(response.content)).size == (480, 240)
+    assert rendered() == before + 1
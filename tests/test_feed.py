@@ -2,6 +2,7 @@ from tests.test_users import create_random_user
 from tests.test_quest import create_random_quest
 from tests.test_users import create_and_login_user, create_random_image
 from api import utils
+from db import models
 import random
 from io import BytesIO
 
@@ -45,3 +46,91 @@ def test_read_friends_posts(client, db_session):
     )
     response = client.get("/feed/friends", headers={"Authorization": f"Bearer {jwt}"})
     assert response.status_code == 200
+
+
+def test_read_posts_query_count(client, db_session, count_queries):
+    user, jwt = create_and_login_user(client, db_session)
+    create_random_post(client, db_session, jwt)
+
+    count_queries.clear()
+    response = client.get("/feed")
+    assert response.status_code == 200
+    first_count = len(count_queries)
+
+    # More posts must not add more statements to the feed request
+    create_random_post(client, db_session, jwt)
+    create_random_post(client, db_session, jwt)
+
+    count_queries.clear()
+    response = client.get("/feed")
+    assert response.status_code == 200
+    assert len(count_queries) == first_count == 1
+
+    post = response.json()[0]
+    assert post["image_url"] == f"/posts/image/{post['id']}"
+    assert post["profile_picture_url"] == f"/users/profile_picture/{post['username']}"
+
+
+def test_read_posts_pagination(client, db_session):
+    user, jwt = create_and_login_user(client, db_session)
+    for _ in range(3):
+        create_random_post(client, db_session, jwt)
+
+    first_page = client.get("/feed", params={"limit": 2})
+    assert first_page.status_code == 200
+    assert len(first_page.json()) == 2
+    cursor = first_page.headers["X-Next-Cursor"]
+
+    second_page = client.get("/feed", params={"limit": 2, "cursor": cursor})
+    assert second_page.status_code == 200
+
+    # Pages continue in (created_at, id) descending order without overlap
+    keys = [
+        (post["created_at"], post["id"])
+        for post in first_page.json() + second_page.json()
+    ]
+    assert keys == sorted(keys, reverse=True)
+    assert len(set(keys)) == len(keys)
+
+
+def test_read_posts_invalid_cursor(client, db_session):
+    response = client.get("/feed", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid cursor"}
+
+
+def test_friends_timeline(client, db_session, count_queries):
+    friend, friend_jwt = create_and_login_user(client, db_session)
+    old_post = create_random_post(client, db_session, friend_jwt).json()
+    user, jwt = create_and_login_user(client, db_session)
+    headers = {"Authorization": f"Bearer {jwt}"}
+
+    # Adding a friend backfills their recent posts
+    response = client.post(f"/friends/{friend.json()['id']}", headers=headers)
+    assert response.status_code == 200
+    response = client.get("/feed/friends", headers=headers)
+    assert [post["id"] for post in response.json()] == [old_post["id"]]
+
+    # New posts are fanned out to the friend's timeline
+    new_post = create_random_post(client, db_session, friend_jwt).json()
+    count_queries.clear()
+    response = client.get("/feed/friends", headers=headers)
+    assert [post["id"] for post in response.json()] == [new_post["id"], old_post["id"]]
+    assert len([s for s in count_queries if "friend_timeline" in s]) == 1
+
+    # Deleted posts are trimmed from the timeline
+    client.delete(
+        f"/posts/{new_post['id']}", headers={"Authorization": f"Bearer {friend_jwt}"}
+    )
+    response = client.get("/feed/friends", headers=headers)
+    assert [post["id"] for post in response.json()] == [old_post["id"]]
+
+    # Rebuilding from friendships and posts yields the same timeline
+    models.FriendTimeline.rebuild(db_session)
+    response = client.get("/feed/friends", headers=headers)
+    assert [post["id"] for post in response.json()] == [old_post["id"]]
+
+    # Removing the friend evicts their posts
+    client.delete(f"/friends/{friend.json()['id']}", headers=headers)
+    response = client.get("/feed/friends", headers=headers)
+    assert response.json() == []
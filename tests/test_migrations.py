@@ -0,0 +1,102 @@
+import subprocess
+import sys
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+import db
+from db import manage, models
+from api.milestones import QUEST_MILESTONES
+
+
+def test_migrations_match_models():
+    # the tests run on a database built by the migrations, see conftest
+    with db.engine.connect() as connection:
+        context = MigrationContext.configure(connection)
+        assert compare_metadata(context, db.Base.metadata) == []
+
+
+def test_manage_imports_models_first():
+    # `python -m db.manage` imports db.models before the api package
+    result = subprocess.run(
+        [sys.executable, "-c", "import db.models"], capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+
+
+def test_seed_is_idempotent(db_session):
+    # conftest seeded once already
+    manage.seed(db_session)
+    manage.seed(db_session)
+
+    achievements = db_session.query(models.Achievements).all()
+    assert len(achievements) == len({a.id for a in achievements})
+
+    first = QUEST_MILESTONES[1]
+    achievement = db_session.get(models.Achievements, first["id"])
+    assert achievement.description == first["description"]
+    assert achievement.award_tokens == first["award_tokens"]
+
+
+HOT_QUERIES = [
+    (select(models.Posts.id).where(models.Posts.user_id == 1), "ix_posts_user_id"),
+    (
+        select(models.Posts.id)
+        .order_by(models.Posts.created_at.desc(), models.Posts.id.desc())
+        .limit(20),
+        "ix_posts_created_at_id",
+    ),
+    (
+        select(models.UserQuests.id).where(
+            models.UserQuests.user_id == 1, models.UserQuests.quest_id == 1
+        ),
+        "ix_user_quests_user_id_quest_id",
+    ),
+    (
+        select(models.UserQuests.id).where(models.UserQuests.quest_id == 1),
+        "ix_user_quests_quest_id",
+    ),
+    (
+        select(models.QuestVerification.id).where(
+            models.QuestVerification.user_quest_id == 1
+        ),
+        "ix_quests_verification_user_quest_id",
+    ),
+    (
+        select(models.QuestVerification.id).where(
+            models.QuestVerification.verifier_id == 1
+        ),
+        "ix_quests_verification_verifier_id",
+    ),
+    (
+        select(models.Friends.id).where(models.Friends.friend_id == 1),
+        "ix_friends_friend_id",
+    ),
+    (
+        select(models.UserAchievements.id).where(
+            models.UserAchievements.user_id == 1
+        ),
+        "ix_user_achievements_user_id",
+    ),
+    (
+        select(models.BannedUsers.id).where(models.BannedUsers.user_id == 1),
+        "ix_banned_users_user_id",
+    ),
+    (select(models.Admin.id).where(models.Admin.user_id == 1), "ix_admins_user_id"),
+]
+
+
+@pytest.mark.parametrize("query, index", HOT_QUERIES)
+def test_hot_queries_use_indexes(query, index):
+    sql = query.compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+
+    with db.engine.connect() as connection:
+        # the test tables are tiny, make the planner prefer any usable index
+        connection.execute(text("SET enable_seqscan = off"))
+        plan = "\n".join(row[0] for row in connection.execute(text(f"EXPLAIN {sql}")))
+        connection.rollback()
+
+    assert index in plan, plan
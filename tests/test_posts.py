@@ -1,8 +1,11 @@
+import hashlib
+import re
 import pytest
 from io import BytesIO
 from PIL import Image
 from tests.test_users import create_and_login_user
 from tests.test_quest import create_random_quest  # or however you create quests
+from db import models
 
 def _create_test_image(size=(50, 50), color=(255, 0, 0)):
     """
@@ -325,3 +328,279 @@ def test_count_likes_and_dislikes(client, db_session, create_post):
     resp_dislikes_2 = client.get(f"/posts/dislikes/count/{post_id}", headers={"Authorization": f"Bearer {jwt_token}"})
     assert resp_likes_2.json() == 0
     assert resp_dislikes_2.json() == 1
+
+
+# ------------------------------------------------------------------------------
+# Test: Post Image Caching Headers
+# ------------------------------------------------------------------------------
+def test_get_post_image_etag(client, db_session, create_post):
+    """
+    Test that the stored image is served as-is and revalidates with its ETag.
+    """
+    user_data, jwt_token = create_and_login_user(client, db_session)
+    quest_data = create_random_quest(client, db_session, jwt_token).json()
+    post_id = create_post(jwt_token, quest_data["id"], "Cached").json()["id"]
+
+    resp_img = client.get(f"/posts/image/{post_id}")
+    assert resp_img.status_code == 200
+    assert resp_img.headers["content-length"] == str(len(resp_img.content))
+    assert resp_img.headers["cache-control"] == "public, max-age=86400"
+    etag = resp_img.headers["etag"]
+
+    # The ETag is the content hash of the bytes that were stored
+    assert etag == f'"{hashlib.sha256(resp_img.content).hexdigest()}"'
+
+    resp_cached = client.get(f"/posts/image/{post_id}", headers={"If-None-Match": etag})
+    assert resp_cached.status_code == 304
+    assert resp_cached.content == b""
+
+    resp_stale = client.get(f"/posts/image/{post_id}", headers={"If-None-Match": '"stale"'})
+    assert resp_stale.status_code == 200
+
+
+# ------------------------------------------------------------------------------
+# Test: Post Image Size Variants
+# ------------------------------------------------------------------------------
+def test_get_post_image_variants(client, db_session):
+    """
+    Test that the feed size variants of an upload are served by ?size=.
+    """
+    user_data, jwt_token = create_and_login_user(client, db_session)
+    quest_data = create_random_quest(client, db_session, jwt_token).json()
+
+    image = Image.new("RGB", (1200, 600), (0, 128, 255))
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    buffer.seek(0)
+    resp_create = client.post(
+        "/posts",
+        data={"caption": "Variants", "quest_id": str(quest_data["id"])},
+        files={"image": ("test.png", buffer, "image/png")},
+        headers={"Authorization": f"Bearer {jwt_token}"},
+    )
+    post_id = resp_create.json()["id"]
+
+    resp_original = client.get(f"/posts/image/{post_id}")
+    assert Image.open(BytesIO(resp_original.content)).size == (1200, 600)
+
+    resp_small = client.get(f"/posts/image/{post_id}", params={"size": 480})
+    assert resp_small.status_code == 200
+    assert resp_small.headers["content-type"] == "image/jpeg"
+    assert Image.open(BytesIO(resp_small.content)).size == (480, 240)
+    assert resp_small.headers["etag"] != resp_original.headers["etag"]
+
+    resp_invalid = client.get(f"/posts/image/{post_id}", params={"size": 123})
+    assert resp_invalid.status_code == 400
+
+
+# ------------------------------------------------------------------------------
+# Test: Denormalized Reaction Counters
+# ------------------------------------------------------------------------------
+def test_reaction_counters(client, db_session, create_post):
+    """
+    Test that the counters on the post follow every reaction change and that
+    the repair job recomputes counters that drifted.
+    """
+    user_data, jwt_token = create_and_login_user(client, db_session)
+    other_user, other_jwt = create_and_login_user(client, db_session)
+    quest_data = create_random_quest(client, db_session, jwt_token).json()
+    post_id = create_post(jwt_token, quest_data["id"], "Count me!").json()["id"]
+
+    def counts():
+        post = client.get(f"/posts/{post_id}").json()
+        return post["likes_count"], post["dislikes_count"]
+
+    client.post(f"/posts/like/{post_id}", headers={"Authorization": f"Bearer {jwt_token}"})
+    client.post(f"/posts/like/{post_id}", headers={"Authorization": f"Bearer {other_jwt}"})
+    assert counts() == (2, 0)
+
+    # switching a like to a dislike moves it between the counters
+    client.post(f"/posts/dislike/{post_id}", headers={"Authorization": f"Bearer {other_jwt}"})
+    assert counts() == (1, 1)
+
+    client.post(f"/posts/like/{post_id}", headers={"Authorization": f"Bearer {jwt_token}"})
+    assert counts() == (0, 1)
+
+    # break the counters and let the repair job fix them
+    post = db_session.query(models.Posts).filter(models.Posts.id == post_id).first()
+    post.likes_count = 7
+    db_session.commit()
+
+    assert models.Posts.repair_counts(db_session) >= 1
+    assert counts() == (0, 1)
+
+
+# ------------------------------------------------------------------------------
+# Test: Reaction Toggle Round Trip
+# ------------------------------------------------------------------------------
+def test_toggle_reaction_single_statement(client, db_session, create_post, count_queries):
+    """
+    Test that a toggle is one statement and returns the new state and counts.
+    """
+    user_data, jwt_token = create_and_login_user(client, db_session)
+    quest_data = create_random_quest(client, db_session, jwt_token).json()
+    post_id = create_post(jwt_token, quest_data["id"], "Toggle me!").json()["id"]
+    headers = {"Authorization": f"Bearer {jwt_token}"}
+
+    count_queries.clear()
+    resp_like = client.post(f"/posts/like/{post_id}", headers=headers)
+    assert len([s for s in count_queries if "post_reactions" in s]) == 1
+    assert resp_like.json()["reacted"] is True
+    assert resp_like.json()["message"] == "Post liked successfully"
+    assert (resp_like.json()["likes_count"], resp_like.json()["dislikes_count"]) == (1, 0)
+
+    resp_dislike = client.post(f"/posts/dislike/{post_id}", headers=headers)
+    assert resp_dislike.json()["reacted"] is True
+    assert resp_dislike.json()["id"] == resp_like.json()["id"]
+    assert (resp_dislike.json()["likes_count"], resp_dislike.json()["dislikes_count"]) == (0, 1)
+
+    resp_undo = client.post(f"/posts/dislike/{post_id}", headers=headers)
+    assert resp_undo.json()["reacted"] is False
+    assert resp_undo.json()["message"] == "Dislike removed successfully"
+    assert (resp_undo.json()["likes_count"], resp_undo.json()["dislikes_count"]) == (0, 0)
+
+    assert client.post("/posts/like/0", headers=headers).status_code == 404
+
+
+# ------------------------------------------------------------------------------
+# Test: Batched Reaction Lookup
+# ------------------------------------------------------------------------------
+def test_read_my_reactions(client, db_session, create_post, count_queries):
+    """
+    Test that the user's reactions to a page of posts come from one query.
+    """
+    user_data, jwt_token = create_and_login_user(client, db_session)
+    headers = {"Authorization": f"Bearer {jwt_token}"}
+
+    post_ids = []
+    for caption in ("Liked", "Disliked", "Ignored"):
+        quest_data = create_random_quest(client, db_session, jwt_token).json()
+        post_ids.append(create_post(jwt_token, quest_data["id"], caption).json()["id"])
+
+    client.post(f"/posts/like/{post_ids[0]}", headers=headers)
+    client.post(f"/posts/dislike/{post_ids[1]}", headers=headers)
+
+    count_queries.clear()
+    response = client.get("/posts/reactions/me", params={"post_ids": post_ids}, headers=headers)
+    assert response.status_code == 200
+    assert len([s for s in count_queries if "post_reactions" in s]) == 1
+    assert response.json() == [
+        {"post_id": post_ids[0], "reaction": "LIKE"},
+        {"post_id": post_ids[1], "reaction": "DISLIKE"},
+        {"post_id": post_ids[2], "reaction": None},
+    ]
+
+    # another user has not reacted to any of them
+    other_user, other_jwt = create_and_login_user(client, db_session)
+    response = client.get(
+        "/posts/reactions/me",
+        params={"post_ids": post_ids},
+        headers={"Authorization": f"Bearer {other_jwt}"},
+    )
+    assert [reaction["reaction"] for reaction in response.json()] == [None, None, None]
+
+
+# ------------------------------------------------------------------------------
+# Test: Post Lists Do Not Query Per Post
+# ------------------------------------------------------------------------------
+def test_read_posts_query_count(client, db_session, create_post, count_queries):
+    """
+    Test that listing posts runs the same number of statements however many
+    posts there are, with the quest read in the same query.
+    """
+    user_data, jwt_token = create_and_login_user(client, db_session)
+    user_id = user_data.json()["id"]
+    headers = {"Authorization": f"Bearer {jwt_token}"}
+
+    def statements_for(url):
+        # only the statements reading posts and users, not the auth lookups
+        count_queries.clear()
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        statements = [s for s in count_queries if re.search(r"\b(posts|users)\b", s)]
+        return len(statements), response.json()
+
+    quest_data = create_random_quest(client, db_session, jwt_token).json()
+    create_post(jwt_token, quest_data["id"], "First")
+    all_before, _ = statements_for("/posts")
+    user_before, _ = statements_for(f"/users/posts/{user_id}")
+
+    for caption in ("Second", "Third"):
+        quest_data = create_random_quest(client, db_session, jwt_token).json()
+        create_post(jwt_token, quest_data["id"], caption)
+
+    all_after, _ = statements_for("/posts")
+    user_after, posts = statements_for(f"/users/posts/{user_id}")
+    assert (all_after, user_after) == (all_before, user_before)
+    assert all_before >= 1 and user_before >= 1
+
+    assert len(posts) == 3
+    assert posts[-1]["quest_id"] == quest_data["id"]
+    assert posts[-1]["questname"] == quest_data["name"]
+
+
+# ------------------------------------------------------------------------------
+# Test: Post Detail In One Query
+# ------------------------------------------------------------------------------
+def test_read_post_single_query(client, db_session, create_post, count_queries):
+    """
+    Test that the post detail is one statement that does not read the image.
+    """
+    user_data, jwt_token = create_and_login_user(client, db_session)
+    quest_data = create_random_quest(client, db_session, jwt_token).json()
+    post_id = create_post(jwt_token, quest_data["id"], "Detail").json()["id"]
+
+    count_queries.clear()
+    response = client.get(f"/posts/{post_id}")
+    assert response.status_code == 200
+    statements = [s for s in count_queries if re.search(r"\bposts\b", s)]
+    assert len(statements) == 1
+    assert "posts.image" not in statements[0]
+
+    post = response.json()
+    assert post["quest_id"] == quest_data["id"]
+    assert post["questname"] == quest_data["name"]
+    assert post["username"] == user_data.json()["username"]
+
+    assert client.get("/posts/0").status_code == 404
+
+
+# ------------------------------------------------------------------------------
+# Test: Paginated Reactor Lists
+# ------------------------------------------------------------------------------
+def test_read_post_likedby_pages(client, db_session, create_post):
+    """
+    Test that the users who liked a post are listed page by page, newest
+    first, with only their id, username and profile picture url.
+    """
+    user_data, jwt_token = create_and_login_user(client, db_session)
+    headers = {"Authorization": f"Bearer {jwt_token}"}
+    quest_data = create_random_quest(client, db_session, jwt_token).json()
+    post_id = create_post(jwt_token, quest_data["id"], "Popular").json()["id"]
+
+    likers = []
+    for _ in range(5):
+        liker, liker_jwt = create_and_login_user(client, db_session)
+        client.post(f"/posts/like/{post_id}", headers={"Authorization": f"Bearer {liker_jwt}"})
+        likers.append(liker.json()["username"])
+
+    usernames = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(f"/posts/likedby/{post_id}", params=params, headers=headers)
+        assert response.status_code == 200
+        assert len(response.json()) <= 2
+        usernames += [reactor["username"] for reactor in response.json()]
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+
+    assert usernames == likers[::-1]
+    assert set(response.json()[0]) == {"id", "username", "profile_picture_url"}
+
+    response = client.get(f"/posts/dislikedby/{post_id}", headers=headers)
+    assert response.json() == []
+    assert client.get("/posts/likedby/0", headers=headers).status_code == 404
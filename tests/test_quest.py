@@ -1,6 +1,11 @@
 from tests.test_users import create_random_user
 from tests.test_users import create_and_login_user
 from api import utils
+import api.quest_catalog as quest_catalog
+from PIL import Image
+import base64
+import hashlib
+import io
 import random
 
 # TODO add admin functionality
@@ -76,3 +81,149 @@ def test_update_quest(client, db_session):
 
     assert response.status_code == 200
     assert response.json()["name"] == "Updated Quest"
+
+
+def test_quest_list_links_images(client, db_session):
+    user, jwt = create_and_login_user(client, db_session)
+    png = io.BytesIO()
+    Image.new("RGB", (4, 4)).save(png, format="PNG")
+    image = base64.b64encode(png.getvalue()).decode()
+
+    quest = client.post(
+        "/quests",
+        json={
+            "name": "Quest with image",
+            "description": "Test Quest",
+            "location_long": 1.0,
+            "location_lat": 1.0,
+            "points": 10,
+            "start_date": "2022-01-01",
+            "end_date": "2022-01-02",
+            "image": image,
+        },
+        headers={"Authorization": f"Bearer {jwt}"},
+    ).json()
+
+    listed = {q["id"]: q for q in client.get("/quests").json()}
+    assert "image" not in listed[quest["id"]]
+    assert listed[quest["id"]]["image_url"] == f"/quests/image/{quest['id']}"
+
+    response = client.get(listed[quest["id"]]["image_url"])
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.content == png.getvalue()
+
+
+def test_quest_list_etag(client, db_session, count_queries):
+    user, jwt = create_and_login_user(client, db_session)
+    create_random_quest(client, db_session, jwt)
+
+    etag = client.get("/quests").headers["ETag"]
+
+    # unchanged catalog, answered from memory without a body
+    count_queries.clear()
+    response = client.get("/quests", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert not [s for s in count_queries if "FROM quests" in s]
+
+    # a new quest bumps the catalog version and its ETag
+    quest = create_random_quest(client, db_session, jwt).json()
+    response = client.get("/quests", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert quest["id"] in [q["id"] for q in response.json()]
+
+
+def test_quest_list_reflects_updates_and_deletes(client, db_session):
+    user, jwt = create_and_login_user(client, db_session)
+    quest = create_random_quest(client, db_session, jwt).json()
+    client.get("/quests")
+
+    fields = {k: quest[k] for k in quest if k not in ("id", "image_url")}
+    response = client.put(
+        f"/quests/{quest['id']}",
+        json={**fields, "name": "Renamed", "image": "image"},
+        headers={"Authorization": f"Bearer {jwt}"},
+    )
+    assert response.status_code == 200
+    listed = {q["id"]: q for q in client.get("/quests").json()}
+    assert listed[quest["id"]]["name"] == "Renamed"
+
+    client.delete(f"/quests/{quest['id']}")
+    assert quest["id"] not in [q["id"] for q in client.get("/quests").json()]
+
+
+def test_quest_read_is_slim_unless_image_included(client, db_session):
+    user, jwt = create_and_login_user(client, db_session)
+    quest = create_random_quest(client, db_session, jwt).json()
+    assert "image" not in quest
+
+    response = client.get(f"/quests/{quest['id']}")
+    assert response.json() == quest
+
+    # old clients still get the inline image
+    response = client.get(f"/quests/{quest['id']}", params={"include": "image"})
+    assert response.json()["image"] == "image"
+    listed = client.get("/quests", params={"include": "image"}).json()
+    assert {q["id"]: q for q in listed}[quest["id"]]["image"] == "image"
+
+    assert client.get("/quests", params={"include": "other"}).status_code == 422
+    assert client.get("/quests/0").status_code == 404
+
+
+def test_quest_image_caching_headers(client, db_session, count_queries):
+    user, jwt = create_and_login_user(client, db_session)
+    quest = create_random_quest(client, db_session, jwt).json()
+
+    response = client.get(quest["image_url"])
+    assert response.status_code == 200
+    assert response.content == b"image"
+    assert response.headers["Cache-Control"] == "public, no-cache"
+    etag = response.headers["ETag"]
+
+    # revalidation reads the digest only
+    count_queries.clear()
+    response = client.get(quest["image_url"], headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert not [s for s in count_queries if "quests.image," in s or "md5(" in s]
+
+
+def test_quest_image_etag_follows_updates(client, db_session):
+    user, jwt = create_and_login_user(client, db_session)
+    quest = create_random_quest(client, db_session, jwt).json()
+    etag = client.get(quest["image_url"]).headers["ETag"]
+    assert etag == f'"{hashlib.md5(b"image").hexdigest()}"'
+
+    response = client.put(
+        f"/quests/{quest['id']}",
+        json={
+            "name": "Updated Quest",
+            "description": "Updated Description",
+            "location_long": 2.0,
+            "location_lat": 2.0,
+            "points": 20,
+            "start_date": "2022-01-01",
+            "end_date": "2022-01-02",
+            "image": "other image",
+        },
+        headers={"Authorization": f"Bearer {jwt}"},
+    )
+    assert response.status_code == 200
+
+    response = client.get(quest["image_url"], headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.content == b"other image"
+    assert response.headers["ETag"] == f'"{hashlib.md5(b"other image").hexdigest()}"'
+
+
+def test_quest_list_loaded_with_async_session(client, db_session, monkeypatch):
+    catalog = quest_catalog.catalog
+    catalog.bump()
+
+    def fail(db):
+        raise AssertionError("catalog loaded through a sync session")
+
+    monkeypatch.setattr(catalog, "load", fail)
+    response = client.get("/quests")
+    assert response.status_code == 200
+    assert catalog.cached() is not None
@@ -0,0 +1,95 @@
+import time
+from datetime import datetime, timedelta, timezone
+import api.sessions as sessions
+from db import models
+from tests.test_users import create_and_login_user
+
+
+def count_sessions(user_id, db_session):
+    return (
+        db_session.query(models.Sessions)
+        .filter(models.Sessions.user_id == user_id)
+        .count()
+    )
+
+
+def test_login_skips_session_store_by_default(client, db_session, count_queries):
+    user_create_response, _ = create_and_login_user(client, db_session)
+
+    assert not [s for s in count_queries if "INSERT INTO sessions" in s]
+    assert count_sessions(user_create_response.json()["id"], db_session) == 0
+
+
+def test_logins_written_in_batches(client, db_session, monkeypatch, count_queries):
+    monkeypatch.setattr(sessions, "SESSION_STORE", True)
+    user_create_response, _ = create_and_login_user(client, db_session)
+    user_id = user_create_response.json()["id"]
+
+    # the login itself does not write the session
+    assert count_sessions(user_id, db_session) == 0
+
+    sessions.record(user_id, "second-token")
+    count_queries.clear()
+    assert sessions.flush() == 2
+    assert len([s for s in count_queries if "INSERT INTO sessions" in s]) == 1
+
+    session = (
+        db_session.query(models.Sessions)
+        .filter(models.Sessions.session_token == "second-token")
+        .one()
+    )
+    assert session.expires_at - session.created_at == timedelta(days=1)
+
+
+def add_expired_and_live(user_id, db_session):
+    now = datetime.now(timezone.utc)
+    models.Sessions.add_many(
+        [
+            {
+                "user_id": user_id,
+                "session_token": "old",
+                "expires_at": now - timedelta(hours=1),
+            },
+            {
+                "user_id": user_id,
+                "session_token": "new",
+                "expires_at": now + timedelta(hours=1),
+            },
+        ],
+        db_session,
+    )
+
+
+def remaining_tokens(user_id, db_session):
+    remaining = db_session.query(models.Sessions.session_token).filter(
+        models.Sessions.user_id == user_id
+    )
+    return [token for token, in remaining]
+
+
+def test_prune_removes_expired_sessions(client, db_session):
+    user_create_response, _ = create_and_login_user(client, db_session)
+    user_id = user_create_response.json()["id"]
+    add_expired_and_live(user_id, db_session)
+
+    assert sessions.prune() >= 1
+    assert remaining_tokens(user_id, db_session) == ["new"]
+
+
+def test_writer_prunes_without_session_store(client, db_session, monkeypatch):
+    user_create_response, _ = create_and_login_user(client, db_session)
+    user_id = user_create_response.json()["id"]
+    add_expired_and_live(user_id, db_session)
+
+    monkeypatch.setattr(sessions, "SESSION_STORE", False)
+    monkeypatch.setattr(sessions, "SESSION_FLUSH_INTERVAL", 0.01)
+    sessions.stop()
+    sessions.start()
+    try:
+        deadline = time.monotonic() + 5
+        while remaining_tokens(user_id, db_session) != ["new"]:
+            assert time.monotonic() < deadline
+            db_session.rollback()
+            time.sleep(0.05)
+    finally:
+        sessions.stop()
@@ -1,6 +1,7 @@
 # test_users.py
 import random
 from api import utils
+from db import models
 from PIL import Image
 import numpy as np
 import io
@@ -14,7 +15,7 @@ def create_user(client, db_session, user):
 def create_random_user(client, db_session):
     user_data = {
         "username": utils.get_random_string(10),
-        "email": f"test_user_{random.randint(1, 1000)}@example.com",
+        "email": f"test_user_{utils.get_random_string(10)}@example.com",
         "password": "password",
         "date_of_birth": "2004-12-22",
     }
@@ -26,7 +27,7 @@ def create_random_user(client, db_session):
 def create_and_login_user(client, db_session):
     user_data = {
         "username": utils.get_random_string(10),
-        "email": f"test_user_{random.randint(1, 1000)}@example.com",
+        "email": f"test_user_{utils.get_random_string(10)}@example.com",
         "password": "password",
         "date_of_birth": "2004-12-22",
     }
@@ -99,6 +100,33 @@ def test_login_user(client, db_session):
     assert jwt_token is not None
 
 
+def test_login_wrong_password(client, db_session):
+    user_create_response, _ = create_and_login_user(client, db_session)
+
+    response = client.post(
+        "/users/login",
+        json={"username": user_create_response.json()["username"], "password": "wrong"},
+    )
+    assert response.status_code == 400
+
+
+def test_login_rehashes_to_target_cost(client, db_session, monkeypatch):
+    monkeypatch.setattr(utils, "PASSWORD_HASH_ROUNDS", 4)
+    user_create_response, _ = create_and_login_user(client, db_session)
+    user = models.User.get_user(user_create_response.json()["id"], db_session)
+    assert utils.needs_rehash(user.password) is False
+
+    # raising the cost rehashes the password on the next login
+    monkeypatch.setattr(utils, "PASSWORD_HASH_ROUNDS", 5)
+    credentials = {"username": user.username, "password": "password"}
+    assert client.post("/users/login", json=credentials).status_code == 200
+
+    db_session.refresh(user)
+    assert user.password.startswith("$2b$05$")
+    assert user.salt == user.password[:29]
+    assert client.post("/users/login", json=credentials).status_code == 200
+
+
 def test_user_upload_profile_picture(client, db_session):
     user_create_response, jwt_token = create_and_login_user(client, db_session)
     client.headers.update({"Authorization": f"Bearer {jwt_token}"})
@@ -167,3 +195,78 @@ def test_user_get_profile_picture(client, db_session):
     assert retrieved_image.size == (100, 100)
     assert retrieved_image.format == "JPEG"
     assert retrieved_image.mode == "RGB"
+
+
+def test_user_get_profile_picture_etag(client, db_session):
+    user_create_response, jwt_token = create_and_login_user(client, db_session)
+    client.headers.update({"Authorization": f"Bearer {jwt_token}"})
+
+    image_file = create_random_image(100, 100, "RGB", "JPEG")
+    client.post(
+        "/users/profile_picture/upload",
+        files={"profile_picture": ("test_image.jpeg", image_file, "image/jpeg")},
+    )
+
+    url = f"/users/profile_picture/{user_create_response.json()['username']}"
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "public, no-cache"
+
+    response = client.get(url, headers={"If-None-Match": response.headers["etag"]})
+    assert response.status_code == 304
+
+    # Uploading a new picture changes the ETag
+    image_file = create_random_image(100, 100, "RGB", "JPEG")
+    client.post(
+        "/users/profile_picture/upload",
+        files={"profile_picture": ("test_image.jpeg", image_file, "image/jpeg")},
+    )
+    new_response = client.get(url, headers={"If-None-Match": response.headers["etag"]})
+    assert new_response.status_code == 200
+
+
+def test_user_get_profile_picture_variant(client, db_session):
+    user_create_response, jwt_token = create_and_login_user(client, db_session)
+    client.headers.update({"Authorization": f"Bearer {jwt_token}"})
+
+    image_file = create_random_image(300, 200, "RGB", "JPEG")
+    client.post(
+        "/users/profile_picture/upload",
+        files={"profile_picture": ("test_image.jpeg", image_file, "image/jpeg")},
+    )
+
+    response = client.get(
+        f"/users/profile_picture/{user_create_response.json()['username']}",
+        params={"size": 128},
+    )
+    assert response.status_code == 200
+    assert Image.open(io.BytesIO(response.content)).size == (128, 85)
+
+
+def test_needs_rehash_handles_malformed_hashes(monkeypatch):
+    monkeypatch.setattr(utils, "PASSWORD_HASH_ROUNDS", 12)
+    assert utils.needs_rehash("$2b$12$" + "a" * 53) is False
+    assert utils.needs_rehash("$2b$10$" + "a" * 53) is True
+    assert utils.needs_rehash("plaintext") is True
+    assert utils.needs_rehash("$2b$xx$abc") is True
+    assert utils.verify_password("password", "plaintext") is False
+
+
+def test_update_password_uses_target_cost(client, db_session, monkeypatch):
+    monkeypatch.setattr(utils, "PASSWORD_HASH_ROUNDS", 4)
+    user_create_response, jwt_token = create_and_login_user(client, db_session)
+
+    monkeypatch.setattr(utils, "PASSWORD_HASH_ROUNDS", 5)
+    response = client.put(
+        "/users/update/password",
+        params={"password": "new password"},
+        headers={"Authorization": f"Bearer {jwt_token}"},
+    )
+    assert response.status_code == 200
+
+    user = models.User.get_user(user_create_response.json()["id"], db_session)
+    assert user.password.startswith("$2b$05$")
+    assert user.salt == user.password[:29]
+
+    credentials = {"username": user.username, "password": "new password"}
+    assert client.post("/users/login", json=credentials).status_code == 200